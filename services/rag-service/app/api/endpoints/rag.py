@@ -1,17 +1,46 @@
-from fastapi import APIRouter, HTTPException
-from app.services.user_service import get_all_users
-from google import genai
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from app.services.user_service import get_data_version
+from app.services.retrieval import PersonaIndex, refresh_persona_index
+from app.services.answer_cache import answer_cache, normalize_question
+from app.services.sql_template_cache import sql_template_cache
+from app.services.prompt_encoding import encode_results, estimate_tokens, shard_results
+from app.services.intent_rules import match_intent
+from app.services.answer_synthesizer import synthesize_answer
+from app.services.single_flight import SingleFlight
+from app.services.schema_catalog import schema_catalog
+from app.services.sql_analyzer import PERSONAS_COLUMNS, SQLAnalysisError, analyze_sql, split_sql_candidates, strip_code_fence
+from app.services.http_client import get_http_client
+from app.services.resilience import upstream_error
+from app.services.llm_client import llm_client, LLMQueueFullError
+from app.services.prompt_cache import PromptPrefix, static_prefix
 from app.core.config import settings
+from app.core.metrics import QUERY_SHARDS, SQL_CANDIDATES, STAGE_DURATION
+from app.utils.streaming import NDJSON, ndjson_line, read_json_rows, sse_event, wants_event_stream, wants_ndjson
+import asyncio
 import httpx
+import logging
 import re
 from pydantic import BaseModel
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 router = APIRouter()
-client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+
+# Consulta de respaldo cuando la generada no es válida o falla
+FALLBACK_SQL = f"SELECT {', '.join(PERSONAS_COLUMNS)} FROM personas LIMIT 5"
+
+query_flight = SingleFlight("query")
+sql_query_flight = SingleFlight("sql-query")
 
 
 class SQLQueryRequest(BaseModel):
     question: str
+    stream: bool = False
+
+
+class BatchSQLQueryRequest(BaseModel):
+    questions: List[str]
+    stream: bool = False  # Devuelve NDJSON a medida que termina cada pregunta
 
 
 def is_database_related(question: str) -> bool:
@@ -23,36 +52,213 @@ def is_database_related(question: str) -> bool:
     
     return True
 
-async def process_natural_language_query(query: str, user_data: list) -> str:
-    if not is_database_related(query):
-        raise HTTPException(
-            status_code=400, 
-            detail="La pregunta debe estar relacionada con la base de datos de empleados"
-        )
 
+async def ask_model(prompt: str, prefix: Optional[PromptPrefix] = None) -> str:
+    try:
+        return await llm_client.generate(prompt, prefix=prefix)
+    except LLMQueueFullError as e:
+        raise HTTPException(status_code=503, detail=f"LLM overloaded: {str(e)}")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="LLM call timed out")
+
+
+async def stream_model(prompt: str, prefix: Optional[PromptPrefix] = None) -> AsyncIterator[str]:
     try:
-        context = f"""
+        async for chunk in llm_client.generate_stream(prompt, prefix=prefix):
+            yield chunk
+    except LLMQueueFullError as e:
+        raise HTTPException(status_code=503, detail=f"LLM overloaded: {str(e)}")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="LLM call timed out")
+
+
+# Los prompts empiezan con una parte fija (prefijo) que se puede cachear en el
+# proveedor; lo que cambia en cada llamada va después
+EMPLOYEES_INSTRUCTIONS = """
+        Eres un asistente que ayuda a responder preguntas sobre empleados.
+        no puedes responder preguntas que no tengan que ver con la base de datos"""
+EMPLOYEES_PREFIX = static_prefix("employees", EMPLOYEES_INSTRUCTIONS)
+
+REDUCE_PREFIX = static_prefix("employees-reduce", EMPLOYEES_INSTRUCTIONS)
+# Respuesta de una parte de la tabla sin empleados relevantes
+NO_DATA = "SIN DATOS"
+_employee_shards: Optional[Tuple[Tuple[Optional[str], int], List[str]]] = None
+
+ANSWER_INSTRUCTIONS = """
         Eres un asistente que ayuda a responder preguntas sobre empleados.
-        no puedes responder preguntas que no tengan que ver con la base de datos
-        Aquí están los datos de los empleados: {user_data}
+        No puedes responder cosas que no tengan que ver con la base de datos.
+        por ejemplo, no puedes responder preguntas sobre el clima. o sobre sumas que no tengan que ver con el tema.
+        recuerda el contexto y es que solo puedes brindar informacion de los trabajadores.
+
+        IMPORTANTE: NO RESPONDAS LAS PREGUNTAS FUERA DEL ANTERIOR CONTEXTO."""
+ANSWER_PREFIX = static_prefix("answer", ANSWER_INSTRUCTIONS)
+
+
+def build_employees_prompt(query: str, user_data: dict) -> str:
+    return f"""
+        Total de empleados registrados: {user_data["total"]}
+        Empleados que cumplen los filtros de la pregunta: {user_data["matched"]}
+        Aquí están los {len(user_data["rows"])} empleados más relevantes: {user_data["rows"]}
+        Pregunta: {query}
+        Responde en español y de forma concisa.
+        """
+
+
+def employee_shards(index: PersonaIndex) -> List[str]:
+    """The whole table as CSV shards of QUERY_SHARD_TOKEN_BUDGET tokens, reused while the data version holds"""
+    global _employee_shards
+    key = (index.version, settings.QUERY_SHARD_TOKEN_BUDGET)
+    if index.version is None or _employee_shards is None or _employee_shards[0] != key:
+        shards = shard_results(index.rows, settings.QUERY_SHARD_TOKEN_BUDGET) or ["(sin filas)\n"]
+        _employee_shards = (key, shards)
+    return _employee_shards[1]
+
+
+def employees_shard_prefix(index: PersonaIndex, shards: List[str], i: int) -> PromptPrefix:
+    """One shard of the table as a prompt prefix, uploaded once per data version"""
+    if len(shards) == 1:
+        heading = "Todos los empleados (CSV con encabezado):"
+    else:
+        heading = f"Parte {i + 1} de {len(shards)} de los empleados (CSV con encabezado):"
+    total = len(index.rows)
+
+    def build() -> str:
+        return f"""{EMPLOYEES_INSTRUCTIONS}
+        Total de empleados registrados: {total}
+        {heading}
+{shards[i]}"""
+    version = f"{index.version}-{settings.QUERY_SHARD_TOKEN_BUDGET}" if index.version else None
+    return PromptPrefix(f"employees-shard-{i}", version, build)
+
+
+def build_map_prompt(query: str) -> str:
+    return f"""
+        Pregunta: {query}
+        Esta es solo una parte de los empleados. Responde únicamente con la información de esta parte que sirva para
+        responder la pregunta, incluyendo conteos parciales si la pregunta pide contar o calcular algo.
+        Si ningún empleado de esta parte es relevante responde exactamente: {NO_DATA}
+        """
+
+
+def build_reduce_prompt(query: str, total: int, shard_count: int, partials: List[str]) -> str:
+    listed = "\n".join(f"        - {partial}" for partial in partials) or "        (ninguna parte tuvo datos relevantes)"
+    return f"""
+        Total de empleados registrados: {total}
+        La tabla se dividió en {shard_count} partes; estas son las respuestas parciales de las partes con datos relevantes:
+{listed}
+        Pregunta: {query}
+        Combina las respuestas parciales en una sola respuesta, sumando los conteos parciales cuando corresponda.
+        Responde en español y de forma concisa.
+        """
+
+
+async def map_employee_shards(query: str, index: PersonaIndex, shards: List[str]) -> List[str]:
+    """Ask every shard about the question concurrently, keeping only the partial answers that found something"""
+    semaphore = asyncio.Semaphore(settings.QUERY_SHARD_CONCURRENCY)
+
+    async def ask_shard(i: int) -> str:
+        async with semaphore:
+            return await ask_model(build_map_prompt(query), employees_shard_prefix(index, shards, i))
+
+    partials = await asyncio.gather(*(ask_shard(i) for i in range(len(shards))))
+    return [partial.strip() for partial in partials if partial and not partial.strip().upper().startswith(NO_DATA)]
+
+
+async def retrieve_employees(query: str, http_client: httpx.AsyncClient, data_version: Optional[str]) -> dict:
+    """Select only the personas relevant to the question instead of sending the whole table"""
+    index = await refresh_persona_index(http_client, data_version)
+    return index.search(query, k=settings.RETRIEVAL_TOP_K)
+
+
+async def build_employees_context(query: str, http_client: httpx.AsyncClient, data_version: Optional[str]) -> Tuple[PromptPrefix, str]:
+    """
+    Prompt prefix and variable part for /query. By default only the retrieved
+    personas are sent. With QUERY_CONTEXT=snapshot the whole table goes in
+    the prefix, which prompt caching uploads once per data version; when it
+    does not fit in one shard, every shard is asked concurrently (map) and
+    the returned prompt merges their partial answers (reduce).
+    """
+    if settings.QUERY_CONTEXT == "snapshot":
+        index = await refresh_persona_index(http_client, data_version)
+        shards = employee_shards(index)
+        if len(shards) == 1:
+            return employees_shard_prefix(index, shards, 0), f"""
         Pregunta: {query}
         Responde en español y de forma concisa.
         """
+        QUERY_SHARDS.observe(len(shards))
+        partials = await map_employee_shards(query, index, shards)
+        return REDUCE_PREFIX, build_reduce_prompt(query, len(index.rows), len(shards), partials)
+    users = await retrieve_employees(query, http_client, data_version)
+    return EMPLOYEES_PREFIX, build_employees_prompt(query, users)
 
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=context,
+
+def build_answer_prompt(question: str, encoded_results: dict) -> str:
+    return f"""
+        Pregunta: {question}
+        
+        Resultados de la consulta SQL (CSV con encabezado):
+{encoded_results["text"]}
+        
+        Responde a la pregunta en español de forma concisa y natural basándote en los resultados.
+        """
+
+
+async def process_natural_language_query(query: str, prompt: str, prefix: PromptPrefix) -> str:
+    if not is_database_related(query):
+        raise HTTPException(
+            status_code=400, 
+            detail="La pregunta debe estar relacionada con la base de datos de empleados"
         )
+
+    try:
+        response_text = await ask_model(prompt, prefix)
         
-        if response.text:
-            return response.text
+        if response_text:
+            return response_text
         else:
             raise HTTPException(status_code=500, detail="No se generó respuesta")
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
 
+def sql_prompt_prefix(candidates: int = 1) -> PromptPrefix:
+    if candidates > 1:
+        instructions = f"""IMPORTANTE: Genera {candidates} consultas SQL distintas que respondan la pregunta, ordenadas de la más a la menos probable de ser correcta.
+        Responde SOLO con un arreglo JSON de strings, sin explicaciones adicionales ni bloques de código. Las consultas deben ser seguras, eficientes y optimizadas.
+        Cada consulta debe empezar con la palabra clave SELECT. No uses comillas simples para los nombres de columnas.
+        No incluyas punto y coma (;) al final de las consultas."""
+    else:
+        instructions = """IMPORTANTE: Genera SOLO la consulta SQL sin explicaciones adicionales. La consulta debe ser segura, eficiente y optimizada.
+        SOLO usa la palabra clave SELECT al inicio de la consulta. No uses comillas simples para los nombres de columnas.
+        No incluyas punto y coma (;) al final de la consulta."""
+    # El esquema vigente forma parte del prefijo, así que cambia su versión
+    return static_prefix(f"sql-{candidates}", f"""
+        Eres un experto en SQL para PostgreSQL. Necesito que generes una consulta SQL basada en la siguiente pregunta.
+        
+        {schema_catalog.prompt_section()}
+        
+        {instructions}
+        """)
+
+
+def build_sql_prompt(question: str) -> str:
+    return f"""
+        Pregunta: {question}
+        """
+
+
+def clean_generated_sql(text: str) -> str:
+    sql_query = strip_code_fence(text)
+    sql_query = sql_query.replace(';', '')
+    if not sql_query.upper().startswith('SELECT'):
+        sql_query = f"SELECT {sql_query}"
+    return sql_query
+
+
 async def generate_sql_query(question: str) -> str:
     if not is_database_related(question):
         raise HTTPException(
@@ -61,123 +267,461 @@ async def generate_sql_query(question: str) -> str:
         )
         
     try:
-        context = f"""
-        Eres un experto en SQL para PostgreSQL. Necesito que generes una consulta SQL basada en la siguiente pregunta.
-        
-        La base de datos tiene una tabla 'personas' con los siguientes campos:
-        - id (Integer, primary key)
-        - primer_nombre (String)
-        - segundo_nombre (String, nullable)
-        - apellidos (String)
-        - fecha_nacimiento (Date)
-        - genero (Enum: MASCULINO, FEMENINO, NO_BINARIO, PREFIERO_NO_REPORTAR)
-        - correo (String, unique)
-        - celular (String)
-        - nro_documento (String, unique)
-        - tipo_documento (Enum: TARJETA_DE_IDENTIDAD, CEDULA)
-        
-        Pregunta: {question}
+        response_text = await ask_model(build_sql_prompt(question), sql_prompt_prefix())
         
-        IMPORTANTE: Genera SOLO la consulta SQL sin explicaciones adicionales. La consulta debe ser segura, eficiente y optimizada.
-        SOLO usa la palabra clave SELECT al inicio de la consulta. No uses comillas simples para los nombres de columnas.
-        No incluyas punto y coma (;) al final de la consulta.
-        """
-
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=context,
-        )
-        
-        if response.text:
-            sql_query = response.text.strip()
-            sql_query = sql_query.replace(';', '')
-            if not sql_query.upper().startswith('SELECT'):
-                sql_query = f"SELECT {sql_query}"
-            
-            print(f"Generated SQL query: {sql_query}")
+        if response_text:
+            sql_query = clean_generated_sql(response_text)
+            logging.info(f"Generated SQL query: {sql_query}")
             return sql_query
         else:
             raise HTTPException(status_code=500, detail="No se generó consulta SQL")
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating SQL query: {str(e)}")
+
+
+async def generate_sql_candidates(question: str, count: int) -> List[str]:
+    """Ask for `count` ranked alternative queries in a single LLM call"""
+    if not is_database_related(question):
+        raise HTTPException(
+            status_code=400, 
+            detail="La pregunta debe estar relacionada con la base de datos de empleados"
+        )
+
+    try:
+        response_text = await ask_model(build_sql_prompt(question), sql_prompt_prefix(count))
+        candidates = [clean_generated_sql(candidate) for candidate in split_sql_candidates(response_text or "")]
+        if not candidates:
+            raise HTTPException(status_code=500, detail="No se generó consulta SQL")
+        logging.info(f"Generated {len(candidates)} SQL candidates: {candidates}")
+        return candidates[:count]
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating SQL query: {str(e)}")
 
 
-async def execute_sql_query(sql_query: str):
+async def execute_sql_query(
+    sql_query: str,
+    client: httpx.AsyncClient,
+    params: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Run a query on user-service; returns the rows and whether the result had more than were read"""
     try:
-        async with httpx.AsyncClient() as client:
+        payload = {"query": sql_query}
+        if params:
+            payload["params"] = params
+        with STAGE_DURATION.labels(stage="execute_sql").time():
+            # Solo se ejecutan SELECT, así que se pueden reintentar; las filas
+            # llegan en NDJSON y se dejan de leer al llegar al máximo
+            async with client.stream(
+                "POST",
+                "/api/v1/execute-sql",
+                json=payload,
+                headers={"Accept": NDJSON},
+                extensions={"idempotent": True}
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise HTTPException(
+                        status_code=response.status_code,
+                        detail=f"Error executing SQL query: {response.text}"
+                    )
+                return await read_json_rows(response, settings.SQL_MAX_LIMIT)
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        raise upstream_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error executing SQL query: {str(e)}")
+
+
+async def explain_sql_query(sql_query: str, client: httpx.AsyncClient) -> bool:
+    """Check that PostgreSQL can plan the query, without running it"""
+    try:
+        with STAGE_DURATION.labels(stage="explain_sql").time():
             response = await client.post(
-                f"{settings.USER_SERVICE_URL}/api/v1/execute-sql",
-                json={"query": sql_query}
+                "/api/v1/execute-sql",
+                json={"query": sql_query, "explain": True},
+                extensions={"idempotent": True}
             )
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Error executing SQL query: {response.text}"
-                )
-            return response.json()
     except httpx.HTTPError as e:
-        raise HTTPException(status_code=500, detail=f"HTTP error: {str(e)}")
+        logging.warning(f"Could not explain query ({str(e)}): {sql_query}")
+        return False
+    if response.status_code != 200:
+        logging.warning(f"Query does not plan ({response.text}): {sql_query}")
+        return False
+    return True
+
+
+async def prepare_sql_candidates(question: str, http_client: httpx.AsyncClient) -> Tuple[List[str], List[str]]:
+    """
+    Generate SQL for a question and return (runnable, generated): the
+    analyzed queries worth executing, in rank order, and the raw model output.
+    With SQL_CANDIDATES > 1 the model proposes several queries at once and,
+    if SQL_VALIDATE_WITH_EXPLAIN is set, all of them are planned in parallel
+    so a bad first choice does not cost another LLM call.
+    """
+    if settings.SQL_CANDIDATES > 1:
+        generated = await generate_sql_candidates(question, settings.SQL_CANDIDATES)
+    else:
+        generated = [await generate_sql_query(question)]
+    SQL_CANDIDATES.labels(outcome="generated").inc(len(generated))
+
+    runnable: List[str] = []
+    for candidate in generated:
+        try:
+            sql_query = analyze_sql(candidate, question).sql
+        except SQLAnalysisError as e:
+            # No vale la pena enviar a user-service una consulta que va a fallar
+            SQL_CANDIDATES.labels(outcome="rejected").inc()
+            logging.warning(f"Rejected generated SQL ({str(e)}): {candidate}")
+            continue
+        if sql_query not in runnable:
+            runnable.append(sql_query)
+
+    if settings.SQL_VALIDATE_WITH_EXPLAIN and len(runnable) > 1:
+        plannable = await asyncio.gather(*(explain_sql_query(sql_query, http_client) for sql_query in runnable))
+        SQL_CANDIDATES.labels(outcome="unplannable").inc(plannable.count(False))
+        runnable = [sql_query for sql_query, ok in zip(runnable, plannable) if ok]
+    return runnable, generated
+
+
+async def run_sql_pipeline(question: str, http_client: httpx.AsyncClient) -> Dict[str, Any]:
+    """Resolve the SQL for a question and execute it, falling back to a simple query on failure"""
+    # Las preguntas con una forma ya conocida reutilizan su SQL sin pasar por el LLM
+    sql_query, sql_params = sql_template_cache.lookup(question)
+    if sql_query is not None:
+        try:
+            query_results, partial = await execute_sql_query(sql_query, http_client, sql_params)
+            SQL_CANDIDATES.labels(outcome="executed").inc()
+            return {
+                "sql_query": sql_query,
+                "sql_params": sql_params,
+                "results": query_results,
+                "partial": partial,
+                "used_fallback": False,
+            }
+        except HTTPException as e:
+            # La plantilla ya no sirve (p. ej. cambió el esquema): se genera el SQL de nuevo
+            SQL_CANDIDATES.labels(outcome="failed").inc()
+            logging.warning(f"Cached template failed ({e.detail}), regenerating: {sql_query}")
+            sql_template_cache.discard(question)
+
+    runnable, generated = await prepare_sql_candidates(question, http_client)
+    sql_query = runnable[0] if runnable else generated[0]
+    sql_params = None
+    used_fallback = False
+    query_results = None
+    partial = False
+
+    for attempt_query in runnable:
+        try:
+            query_results, partial = await execute_sql_query(attempt_query, http_client)
+        except HTTPException as e:
+            SQL_CANDIDATES.labels(outcome="failed").inc()
+            logging.warning(f"Query failed ({e.detail}): {attempt_query}")
+            continue
+        SQL_CANDIDATES.labels(outcome="executed").inc()
+        sql_query = attempt_query
+        sql_template_cache.store(question, sql_query)
+        break
+    else:
+        used_fallback = True
+        query_results, partial = await execute_sql_query(FALLBACK_SQL, http_client)
+
+    return {
+        "sql_query": sql_query,
+        "sql_params": sql_params,
+        "results": query_results,
+        "partial": partial,
+        "used_fallback": used_fallback,
+    }
+
+
+async def answer_with_rules(question: str, http_client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    """Answer common question shapes with fixed SQL and a response template, without the LLM"""
+    intent = match_intent(question)
+    if intent is None:
+        return None
+    try:
+        query_results, partial = await execute_sql_query(intent.sql, http_client, intent.params)
+        if partial:
+            # Las plantillas cuentan o listan todas las filas; con un resultado recortado mentirían
+            return None
+        response_text = intent.render(query_results)
+    except (HTTPException, KeyError, TypeError, ValueError):
+        # Si la regla no puede responder se deja que el LLM lo intente
+        return None
+    return {
+        "question": question,
+        "sql_query": intent.sql,
+        "sql_params": intent.params,
+        "results": query_results,
+        "response": response_text,
+        "intent": intent.intent
+    }
+
+
+async def answer_employees_question(query: str, http_client: httpx.AsyncClient) -> Dict[str, Any]:
+    """Non-streaming /query flow with answer cache and coalescing of identical in-flight questions"""
+    data_version = await get_data_version(http_client)
+    cached = answer_cache.get("query", query, data_version)
+    if cached is not None:
+        return cached
+
+    async def compute() -> Dict[str, Any]:
+        prefix, prompt = await build_employees_context(query, http_client, data_version)
+        response = await process_natural_language_query(query, prompt, prefix)
+        result = {"response": response}
+        answer_cache.set("query", query, data_version, result)
+        return result
+
+    return await query_flight.do((data_version, normalize_question(query)), compute)
+
+
+def error_detail(e: Exception) -> str:
+    return e.detail if isinstance(e, HTTPException) else str(e)
+
+
+async def stream_query_answer(query: str, http_client: httpx.AsyncClient) -> AsyncIterator[str]:
+    try:
+        data_version = await get_data_version(http_client)
+        cached = answer_cache.get("query", query, data_version)
+        if cached is not None:
+            yield sse_event("token", {"text": cached["response"]})
+            yield sse_event("done", cached)
+            return
+
+        prefix, prompt = await build_employees_context(query, http_client, data_version)
+        chunks = []
+        async for chunk in stream_model(prompt, prefix):
+            chunks.append(chunk)
+            yield sse_event("token", {"text": chunk})
+
+        result = {"response": "".join(chunks)}
+        answer_cache.set("query", query, data_version, result)
+        yield sse_event("done", result)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error executing SQL query: {str(e)}")
+        yield sse_event("error", {"detail": error_detail(e)})
+
+
+async def stream_sql_answer(question: str, http_client: httpx.AsyncClient) -> AsyncIterator[str]:
+    try:
+        data_version = await get_data_version(http_client)
+        cached = answer_cache.get("sql-query", question, data_version)
+        if cached is not None:
+            yield sse_event("sql", {"sql_query": cached["sql_query"], "sql_params": cached["sql_params"]})
+            yield sse_event("results", cached["results"])
+            yield sse_event("token", {"text": cached["response"]})
+            yield sse_event("done", {**cached, "question": question})
+            return
+
+        ruled = await answer_with_rules(question, http_client)
+        if ruled is not None:
+            answer_cache.set("sql-query", question, data_version, ruled)
+            yield sse_event("sql", {"sql_query": ruled["sql_query"], "sql_params": ruled["sql_params"]})
+            yield sse_event("results", ruled["results"])
+            yield sse_event("token", {"text": ruled["response"]})
+            yield sse_event("done", ruled)
+            return
+
+        pipeline = await run_sql_pipeline(question, http_client)
+        yield sse_event("sql", {"sql_query": pipeline["sql_query"], "sql_params": pipeline["sql_params"]})
+        yield sse_event("results", pipeline["results"])
+
+        # Los resultados triviales se redactan localmente sin segunda llamada al LLM
+        response_text = None if pipeline["used_fallback"] or pipeline["partial"] else synthesize_answer(pipeline["results"])
+        prompt_tokens = 0
+        truncated = pipeline["partial"]
+        if response_text is not None:
+            yield sse_event("token", {"text": response_text})
+        else:
+            encoded = encode_results(pipeline["results"], settings.ANSWER_PROMPT_TOKEN_BUDGET, partial=pipeline["partial"])
+            prompt = build_answer_prompt(question, encoded)
+            prompt_tokens = estimate_tokens(ANSWER_INSTRUCTIONS + prompt)
+            truncated = encoded["truncated"]
+            chunks = []
+            async for chunk in stream_model(prompt, ANSWER_PREFIX):
+                chunks.append(chunk)
+                yield sse_event("token", {"text": chunk})
+            response_text = "".join(chunks)
+
+        result = {
+            "question": question,
+            "sql_query": pipeline["sql_query"],
+            "sql_params": pipeline["sql_params"],
+            "results": pipeline["results"],
+            "response": response_text,
+            "prompt_tokens_estimate": prompt_tokens,
+            "results_truncated": truncated
+        }
+        if not pipeline["used_fallback"]:
+            answer_cache.set("sql-query", question, data_version, result)
+        yield sse_event("done", result)
+    except Exception as e:
+        yield sse_event("error", {"detail": error_detail(e)})
 
 
 @router.post("/query")
-async def query_employees(query: str):
+async def query_employees(
+    query: str,
+    stream: bool = False,
+    accept: Optional[str] = Header(None),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+):
+    if stream or wants_event_stream(accept):
+        return StreamingResponse(stream_query_answer(query, http_client), media_type="text/event-stream")
+
     try:
-        users = await get_all_users()
-        response = await process_natural_language_query(query, users)
-        return {"response": response}
+        return await answer_employees_question(query, http_client)
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        raise upstream_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def answer_sql_question(question: str, http_client: httpx.AsyncClient) -> Dict[str, Any]:
+    """Full non-streaming /sql-query flow: answer cache, rules, SQL pipeline and answer phrasing"""
+    data_version = await get_data_version(http_client)
+    cached = answer_cache.get("sql-query", question, data_version)
+    if cached is not None:
+        return {**cached, "question": question}
+
+    # Las preguntas idénticas que llegan a la vez comparten un único cálculo
+    result = await sql_query_flight.do(
+        (data_version, normalize_question(question)),
+        lambda: compute_sql_answer(question, http_client, data_version)
+    )
+    return {**result, "question": question}
+
+
+async def compute_sql_answer(question: str, http_client: httpx.AsyncClient, data_version: Optional[str]) -> Dict[str, Any]:
+    ruled = await answer_with_rules(question, http_client)
+    if ruled is not None:
+        answer_cache.set("sql-query", question, data_version, ruled)
+        return ruled
+
+    pipeline = await run_sql_pipeline(question, http_client)
+    
+    # Los resultados triviales se redactan localmente sin segunda llamada al LLM
+    response_text = None if pipeline["used_fallback"] or pipeline["partial"] else synthesize_answer(pipeline["results"])
+    prompt_tokens = 0
+    truncated = pipeline["partial"]
+    if response_text is None:
+        encoded = encode_results(pipeline["results"], settings.ANSWER_PROMPT_TOKEN_BUDGET, partial=pipeline["partial"])
+        context = build_answer_prompt(question, encoded)
+        prompt_tokens = estimate_tokens(ANSWER_INSTRUCTIONS + context)
+        truncated = encoded["truncated"]
+        
+        response_text = await ask_model(context, ANSWER_PREFIX)
+        
+        if not response_text:
+            raise HTTPException(status_code=500, detail="No se generó respuesta")
+        
+    result = {
+        "question": question,
+        "sql_query": pipeline["sql_query"],
+        "sql_params": pipeline["sql_params"],
+        "results": pipeline["results"],
+        "response": response_text,
+        "prompt_tokens_estimate": prompt_tokens,
+        "results_truncated": truncated
+    }
+    # Las respuestas basadas en la consulta de respaldo no se guardan
+    if not pipeline["used_fallback"]:
+        answer_cache.set("sql-query", question, data_version, result)
+    return result
+
+
+async def answer_batch_item(question: str, http_client: httpx.AsyncClient, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+    """Answer one batch question, turning failures into a per-item error instead of failing the batch"""
+    async with semaphore:
+        try:
+            return {"question": question, "result": await answer_sql_question(question, http_client)}
+        except HTTPException as e:
+            return {"question": question, "error": {"status_code": e.status_code, "detail": e.detail}}
+        except Exception as e:
+            return {"question": question, "error": {"status_code": 500, "detail": str(e)}}
+
+
+def dedupe_questions(questions: List[str]) -> Dict[str, List[str]]:
+    """Group questions by normalized form; the first spelling of each group is the one executed"""
+    groups: Dict[str, List[str]] = {}
+    for question in questions:
+        groups.setdefault(normalize_question(question), []).append(question)
+    return {variants[0]: variants for variants in groups.values()}
+
+
+async def stream_batch(unique: Dict[str, List[str]], http_client: httpx.AsyncClient) -> AsyncIterator[str]:
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    tasks = [asyncio.create_task(answer_batch_item(question, http_client, semaphore)) for question in unique]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            item = await finished
+            for question in unique[item["question"]]:
+                yield ndjson_line({**item, "question": question})
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
 @router.post("/sql-query")
-async def sql_query_endpoint(request: SQLQueryRequest):
+async def sql_query_endpoint(
+    request: SQLQueryRequest,
+    accept: Optional[str] = Header(None),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+):
     try:
         if not is_database_related(request.question):
             raise HTTPException(
                 status_code=400, 
                 detail="La pregunta debe estar relacionada con la base de datos de empleados"
             )
-            
-        sql_query = await generate_sql_query(request.question)
-        
-        try:
-            query_results = await execute_sql_query(sql_query)
-        except HTTPException as e:
-            print(f"Original query failed: {sql_query}")
-            simplified_query = f"SELECT * FROM personas LIMIT 5"
-            print(f"Trying simplified query: {simplified_query}")
-            query_results = await execute_sql_query(simplified_query)
-        
-        context = f"""
-        Eres un asistente que ayuda a responder preguntas sobre empleados.
-        No puedes responder cosas que no tengan que ver con la base de datos.
-        por ejemplo, no puedes responder preguntas sobre el clima. o sobre sumas que no tengan que ver con el tema.
-        recuerda el contexto y es que solo puedes brindar informacion de los trabajadores.
 
-        IMPORTANTE: NO RESPONDAS LAS PREGUNTAS FUERA DEL ANTERIOR CONTEXTO.
-        Pregunta: {request.question}
-        
-        Resultados de la consulta SQL: {query_results}
-        
-        Responde a la pregunta en español de forma concisa y natural basándote en los resultados.
-        """
-        
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=context,
-        )
-        
-        if not response.text:
-            raise HTTPException(status_code=500, detail="No se generó respuesta")
-            
-        return {
-            "question": request.question,
-            "sql_query": sql_query,
-            "results": query_results,
-            "response": response.text
-        }
+        if request.stream or wants_event_stream(accept):
+            return StreamingResponse(stream_sql_answer(request.question, http_client), media_type="text/event-stream")
+
+        return await answer_sql_question(request.question, http_client)
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        raise upstream_error(e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/sql-query/batch")
+async def sql_query_batch_endpoint(
+    request: BatchSQLQueryRequest,
+    accept: Optional[str] = Header(None),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+):
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="Debe enviar al menos una pregunta")
+    if len(request.questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Se permiten como máximo {settings.BATCH_MAX_QUESTIONS} preguntas por lote"
+        )
+
+    # Las preguntas equivalentes se ejecutan una sola vez
+    unique = dedupe_questions(request.questions)
+
+    if request.stream or wants_ndjson(accept):
+        return StreamingResponse(stream_batch(unique, http_client), media_type="application/x-ndjson")
+
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    items = await asyncio.gather(*(answer_batch_item(question, http_client, semaphore) for question in unique))
+    by_question = {item["question"]: item for item in items}
+    canonical = {variant: question for question, variants in unique.items() for variant in variants}
+    return {
+        "total": len(request.questions),
+        "unique": len(unique),
+        "items": [{**by_question[canonical[question]], "question": question} for question in request.questions]
+    }
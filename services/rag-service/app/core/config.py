@@ -3,8 +3,84 @@ from typing import Optional
 
 
 class Settings(BaseSettings):
-    GOOGLE_API_KEY: str
+    GOOGLE_API_KEY: Optional[str] = None  # Required when LLM_BACKEND is "gemini"
     USER_SERVICE_URL: str = "http://user-service:8000"  # Default for Docker environment
+
+    # HTTP client for user-service
+    USER_SERVICE_MAX_CONNECTIONS: int = 100
+    USER_SERVICE_MAX_KEEPALIVE: int = 20
+    USER_SERVICE_KEEPALIVE_EXPIRY: float = 30.0  # Seconds an idle connection is kept open
+    USER_SERVICE_HTTP2: bool = False
+    USER_SERVICE_CONNECT_TIMEOUT: float = 2.0
+    USER_SERVICE_READ_TIMEOUT: float = 30.0
+
+    # Resilience of calls to user-service
+    REQUEST_DEADLINE_SECONDS: float = 60.0  # Budget per incoming request, shared by its user-service calls
+    USER_SERVICE_RETRIES: int = 2  # Extra attempts for idempotent reads
+    USER_SERVICE_RETRY_BACKOFF_SECONDS: float = 0.1  # Base of the jittered exponential backoff
+    USER_SERVICE_RETRY_BACKOFF_MAX_SECONDS: float = 2.0
+    USER_SERVICE_BREAKER_FAILURES: int = 5  # Consecutive failures that open the circuit
+    USER_SERVICE_BREAKER_RESET_SECONDS: float = 30.0  # Time open before a probe call is let through
+    USER_SERVICE_HEDGE_AFTER_MS: Optional[float] = None  # Resend idempotent reads still pending after this; disabled when unset
+
+    # Answer cache
+    ANSWER_CACHE_MAX_ENTRIES: int = 1024
+    ANSWER_CACHE_TTL_SECONDS: float = 600.0
+    DATA_VERSION_TTL_SECONDS: float = 1.0  # How long a fetched personas version is trusted
+
+    # Generated SQL cache
+    SQL_TEMPLATE_CACHE_MAX_ENTRIES: int = 512
+
+    # Schema introspection
+    SCHEMA_REFRESH_SECONDS: float = 300.0  # How often the personas schema and stats are re-read
+
+    # Analysis of generated SQL
+    SQL_DEFAULT_LIMIT: int = 100  # Added to generated queries without a LIMIT
+    SQL_MAX_LIMIT: int = 1000  # Larger LIMITs are lowered to this, and no more rows are read from a result
+    SQL_CANDIDATES: int = 1  # Ranked queries requested per LLM call; 1 disables candidates
+    SQL_VALIDATE_WITH_EXPLAIN: bool = False  # EXPLAIN candidates in parallel before executing one
+
+    # Retrieval index for /query
+    RETRIEVAL_TOP_K: int = 20  # Personas included in the prompt
+    RETRIEVAL_FEATURES: int = 1024  # Width of the hashed feature vectors
+    VECTOR_STORE_DIR: Optional[str] = None  # Directory for the persisted index; disabled when unset
+    VECTOR_STORE_RETENTION_SECONDS: float = 600.0  # Keep superseded generations this long for replicas still loading them
+
+    # Local replica of personas, kept up to date with incremental deltas
+    REPLICA_PAGE_SIZE: int = 500  # Rows per page read from user-service
+    REPLICA_MAX_STALENESS_SECONDS: float = 60.0  # Sync at least this often, even if the data version is unchanged
+    REPLICA_WATERMARK_OVERLAP_SECONDS: float = 5.0  # Re-read this much before the watermark to catch late commits
+
+    # Encoding of SQL results in the answer prompt
+    ANSWER_PROMPT_TOKEN_BUDGET: int = 2000  # Approximate tokens allowed for the results table
+
+    # Batch questions
+    BATCH_MAX_QUESTIONS: int = 100
+    BATCH_MAX_CONCURRENCY: int = 8  # Questions of one batch processed at the same time
+
+    # LLM client
+    LLM_BACKEND: str = "gemini"  # "gemini", or "stub" to run without the API
+    GEMINI_MODEL: str = "gemini-2.0-flash"
+    LLM_MAX_CONCURRENCY: int = 8  # Max simultaneous calls to Gemini
+    LLM_MAX_QUEUE: int = 64  # Max calls waiting for a free slot before rejecting
+    LLM_TIMEOUT_SECONDS: float = 30.0  # Deadline per call, including time spent queued
+
+    # Provider-side caching of stable prompt prefixes
+    PROMPT_CACHE_ENABLED: bool = False
+    PROMPT_CACHE_TTL_SECONDS: float = 3600.0
+    PROMPT_CACHE_MIN_TOKENS: int = 4096  # Provider minimum; shorter prefixes are sent inline
+    PROMPT_CACHE_REFRESH_MARGIN_SECONDS: float = 60.0  # Extend the TTL when a cache this close to expiry is used
+    QUERY_CONTEXT: str = "retrieval"  # /query context: "retrieval" (top-K rows) or "snapshot" (whole table)
+    QUERY_SHARD_TOKEN_BUDGET: int = 8000  # Larger snapshots are answered map-reduce over shards of this size
+    QUERY_SHARD_CONCURRENCY: int = 4  # Shards of one question asked at the same time
+
+    # Local stub model (LLM_BACKEND=stub)
+    LLM_STUB_LATENCY_MS: float = 200.0  # Median latency per call
+    LLM_STUB_LATENCY_SIGMA: float = 0.0  # Log-normal shape of the latency; 0 keeps it fixed
+    LLM_STUB_CHUNK_CHARS: int = 16  # Characters per streamed chunk
+    LLM_STUB_CHUNK_DELAY_MS: float = 20.0  # Delay between streamed chunks
+    LLM_STUB_SCRIPT: Optional[str] = None  # JSON file with [{"pattern", "response"}] rules
+    LLM_STUB_SEED: Optional[int] = None  # Seed for reproducible latencies
     
     model_config = {
         "env_file": ".env",
@@ -12,4 +88,4 @@ class Settings(BaseSettings):
         "extra": "allow"
     }
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
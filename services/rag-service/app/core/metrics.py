@@ -0,0 +1,164 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Answer cache
+ANSWER_CACHE_HITS = Counter(
+    "rag_answer_cache_hits_total",
+    "Answers served from the answer cache",
+    ["endpoint"],
+)
+ANSWER_CACHE_MISSES = Counter(
+    "rag_answer_cache_misses_total",
+    "Answer cache lookups that required a full computation",
+    ["endpoint"],
+)
+
+# Generated SQL cache
+SQL_TEMPLATE_CACHE_HITS = Counter(
+    "rag_sql_template_cache_hits_total",
+    "Questions whose SQL came from a cached template instead of the LLM",
+)
+SQL_TEMPLATE_CACHE_MISSES = Counter(
+    "rag_sql_template_cache_misses_total",
+    "Questions that needed the LLM to generate SQL",
+)
+
+# Rule-based fast path
+INTENT_RULE_LOOKUPS = Counter(
+    "rag_intent_rule_lookups_total",
+    "Questions checked against the rule-based intent matcher",
+)
+INTENT_RULE_MATCHES = Counter(
+    "rag_intent_rule_matches_total",
+    "Intent matcher outcomes; intent=\"none\" means the question fell through to the LLM",
+    ["intent"],
+)
+
+# Request coalescing
+SINGLE_FLIGHT_COALESCED = Counter(
+    "rag_singleflight_coalesced_total",
+    "Requests that joined an identical in-flight computation instead of starting their own",
+    ["endpoint"],
+)
+SINGLE_FLIGHT_WAITERS = Gauge(
+    "rag_singleflight_waiters",
+    "Requests currently waiting on an identical in-flight computation",
+    ["endpoint"],
+)
+
+# Schema introspection
+SCHEMA_REFRESHES = Counter(
+    "rag_schema_refreshes_total",
+    "Reads of the personas schema and statistics from user-service",
+    ["outcome"],
+)
+
+# Analysis of generated SQL
+SQL_ANALYSIS = Counter(
+    "rag_sql_analysis_total",
+    "Generated SQL queries by analysis outcome (unchanged, rewritten, rejected)",
+    ["outcome"],
+)
+SQL_CANDIDATES = Counter(
+    "rag_sql_candidates_total",
+    "Generated SQL candidates by outcome (generated, rejected, unplannable, failed, executed)",
+    ["outcome"],
+)
+
+# LLM calls
+LLM_CALLS = Counter(
+    "rag_llm_calls_total",
+    "Calls to the LLM by outcome (ok, rejected, timeout, cancelled, error)",
+    ["model", "operation", "outcome"],
+)
+LLM_CALL_DURATION = Histogram(
+    "rag_llm_call_duration_seconds",
+    "Wall time of LLM calls, including time queued for a free slot",
+    ["model", "operation", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_llm_time_to_first_token_seconds",
+    "Time until the first text chunk of a streaming LLM call",
+    ["model"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16),
+)
+LLM_QUEUE_WAIT = Histogram(
+    "rag_llm_queue_wait_seconds",
+    "Time LLM calls waited for a concurrency slot",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+)
+LLM_PROMPT_CHARS = Histogram(
+    "rag_llm_prompt_chars",
+    "Prompt size in characters",
+    ["model"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000),
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total",
+    "Tokens reported by the LLM usage metadata",
+    ["model", "direction"],
+)
+
+# Local personas replica
+REPLICA_SYNCS = Counter(
+    "rag_replica_syncs_total",
+    "Syncs of the personas replica by mode (full, delta) and outcome",
+    ["mode", "outcome"],
+)
+REPLICA_CHANGES = Counter(
+    "rag_replica_changes_total",
+    "Personas applied to the replica by syncs",
+    ["change"],
+)
+REPLICA_AGE = Gauge(
+    "rag_replica_age_seconds",
+    "Seconds since the personas replica last synced, set whenever it is read",
+)
+
+# Resilience of calls to user-service
+USER_SERVICE_BREAKER_STATE = Gauge(
+    "rag_user_service_breaker_state",
+    "Circuit breaker state for user-service (0 closed, 1 half-open, 2 open)",
+)
+USER_SERVICE_BREAKER_TRANSITIONS = Counter(
+    "rag_user_service_breaker_transitions_total",
+    "Circuit breaker state changes, by the state entered",
+    ["state"],
+)
+USER_SERVICE_RETRIES = Counter(
+    "rag_user_service_retries_total",
+    "Retried calls to user-service by reason",
+    ["reason"],
+)
+USER_SERVICE_HEDGES = Counter(
+    "rag_user_service_hedges_total",
+    "Hedged calls to user-service (sent, and won by the hedge)",
+    ["outcome"],
+)
+USER_SERVICE_REJECTED = Counter(
+    "rag_user_service_rejected_total",
+    "Calls to user-service failed by the breaker or the request deadline, not counted as upstream failures (circuit_open, deadline)",
+    ["reason"],
+)
+
+# Time spent in each stage of a request, to split LLM time from SQL and HTTP time
+STAGE_DURATION = Histogram(
+    "rag_stage_duration_seconds",
+    "Wall time of non-LLM request stages",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# Provider-side prompt caching
+PROMPT_CACHE_EVENTS = Counter(
+    "rag_prompt_cache_events_total",
+    "Cached prompt prefix lookups (hit, created, refreshed, inline, error)",
+    ["slot", "event"],
+)
+
+# Map-reduce over the personas table in /query
+QUERY_SHARDS = Histogram(
+    "rag_query_shards",
+    "Shards asked per map-reduce /query answer",
+    buckets=(2, 4, 8, 16, 32, 64, 128),
+)
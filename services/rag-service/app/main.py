@@ -1,11 +1,38 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.api.endpoints import rag, logs
+from app.core.config import settings
+from app.services.http_client import create_http_client
+from app.services.resilience import deadline_middleware
+from app.services.retrieval import load_persona_store
+from app.services.schema_catalog import schema_catalog
 from app.utils.logger import logging_middleware
 from fastapi.middleware.cors import CORSMiddleware  # Importar el middleware CORS
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Un solo cliente HTTP con pool de conexiones para todo el servicio
+    app.state.http_client = create_http_client()
+    # El índice persistido permite atender desde el arranque sin recodificar
+    if settings.VECTOR_STORE_DIR:
+        load_persona_store(settings.VECTOR_STORE_DIR)
+    # El esquema real de personas alimenta el prompt de generación de SQL
+    schema_refresh = asyncio.create_task(schema_catalog.run(app.state.http_client, settings.SCHEMA_REFRESH_SECONDS))
+    try:
+        yield
+    finally:
+        schema_refresh.cancel()
+        await app.state.http_client.aclose()
+
+
 app = FastAPI(
     title="Employee RAG Service",
     description="Natural Language Query Service for Employee Data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 app.add_middleware(
     CORSMiddleware,
@@ -16,6 +43,12 @@ app.add_middleware(
 )
 # Add middleware
 app.middleware("http")(logging_middleware)
+app.middleware("http")(deadline_middleware(settings.REQUEST_DEADLINE_SECONDS))
 
 app.include_router(rag.router, prefix="/api/v1/rag", tags=["rag"])
-app.include_router(logs.router, prefix="/api/v1", tags=["logs"])
\ No newline at end of file
+app.include_router(logs.router, prefix="/api/v1", tags=["logs"])
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,55 @@
+import re
+import unicodedata
+from typing import Any, Optional
+from cachetools import TTLCache
+from app.core.config import settings
+from app.core.metrics import ANSWER_CACHE_HITS, ANSWER_CACHE_MISSES
+
+
+def normalize_question(question: str) -> str:
+    """
+    Reduce a question to a canonical form so trivial rewordings share a key:
+    "¿Cuántos empleados hay" and "cuantos empleados hay?" both become
+    "cuantos empleados hay".
+    """
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class AnswerCache:
+    """LRU cache with TTL for complete endpoint responses, keyed by normalized question and data version"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _key(endpoint: str, question: str, version: str) -> tuple:
+        return (endpoint, version, normalize_question(question))
+
+    def get(self, endpoint: str, question: str, version: Optional[str]) -> Optional[Any]:
+        if version is None:
+            ANSWER_CACHE_MISSES.labels(endpoint=endpoint).inc()
+            return None
+        value = self._cache.get(self._key(endpoint, question, version))
+        if value is None:
+            ANSWER_CACHE_MISSES.labels(endpoint=endpoint).inc()
+        else:
+            ANSWER_CACHE_HITS.labels(endpoint=endpoint).inc()
+        return value
+
+    def set(self, endpoint: str, question: str, version: Optional[str], value: Any) -> None:
+        # Sin versión no hay forma de invalidar, así que no se guarda
+        if version is None:
+            return
+        self._cache[self._key(endpoint, question, version)] = value
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+answer_cache = AnswerCache(
+    maxsize=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl=settings.ANSWER_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,71 @@
+from typing import Any, Dict, Optional
+from app.services.intent_rules import GENERO_LABELS, full_name
+
+# Listas de nombres más largas que esto se dejan al modelo
+MAX_SYNTHESIZED_NAMES = 20
+
+NAME_FIELDS = {"primer_nombre", "segundo_nombre", "apellidos"}
+_SCALAR_PHRASES = (
+    (("count", "total", "cantidad", "numero", "num"), "La cantidad es {value}."),
+    (("avg", "promedio", "media"), "El promedio es {value}."),
+    (("min", "minimo"), "El valor mínimo es {value}."),
+    (("max", "maximo"), "El valor máximo es {value}."),
+    (("sum", "suma"), "La suma es {value}."),
+)
+
+
+def _label(column: str) -> str:
+    return column.replace("_", " ")
+
+
+def _format_value(column: str, value: Any) -> str:
+    if value is None:
+        return "sin dato"
+    if column == "genero":
+        return GENERO_LABELS.get(value, str(value))
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def _scalar_answer(column: str, value: Any) -> str:
+    key = column.lower()
+    for prefixes, phrase in _SCALAR_PHRASES:
+        if any(key == prefix or key.startswith(f"{prefix}_") or key.endswith(f"_{prefix}") for prefix in prefixes):
+            return phrase.format(value=_format_value(column, value))
+    return f"El resultado ({_label(column)}) es {_format_value(column, value)}."
+
+
+def _row_answer(row: Dict[str, Any]) -> str:
+    details = [f"{_label(column)}: {_format_value(column, value)}" for column, value in row.items() if column not in NAME_FIELDS and column != "id"]
+    name = full_name(row)
+    if name and details:
+        return f"{name} ({', '.join(details)})."
+    if name:
+        return f"{name}."
+    return f"Resultado: {', '.join(details)}."
+
+
+def synthesize_answer(results: Any) -> Optional[str]:
+    """
+    Phrase the answer locally when the result shape is trivial: empty, a
+    single scalar, a single row, or a short list of names. Returns None when
+    the results need the model to summarize them.
+    """
+    if not isinstance(results, list) or not all(isinstance(row, dict) for row in results):
+        return None
+    if not results:
+        return "No se encontraron resultados para tu pregunta."
+
+    if len(results) == 1:
+        row = results[0]
+        if len(row) == 1:
+            column, value = next(iter(row.items()))
+            return _scalar_answer(column, value)
+        return _row_answer(row)
+
+    columns = set().union(*(row.keys() for row in results))
+    if len(results) <= MAX_SYNTHESIZED_NAMES and columns and columns <= NAME_FIELDS | {"id"} and columns & NAME_FIELDS:
+        names = ", ".join(full_name(row) for row in results)
+        return f"Se encontraron {len(results)} personas: {names}."
+    return None
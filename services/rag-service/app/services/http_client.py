@@ -0,0 +1,36 @@
+import httpx
+from fastapi import Request
+from app.core.config import settings
+from app.services.resilience import CircuitBreaker, ResilientTransport
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build the pooled client used for every call to user-service"""
+    transport = httpx.AsyncHTTPTransport(
+        http2=settings.USER_SERVICE_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.USER_SERVICE_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.USER_SERVICE_MAX_KEEPALIVE,
+            keepalive_expiry=settings.USER_SERVICE_KEEPALIVE_EXPIRY,
+        ),
+    )
+    hedge_after = settings.USER_SERVICE_HEDGE_AFTER_MS
+    return httpx.AsyncClient(
+        base_url=settings.USER_SERVICE_URL,
+        transport=ResilientTransport(
+            transport,
+            CircuitBreaker(settings.USER_SERVICE_BREAKER_FAILURES, settings.USER_SERVICE_BREAKER_RESET_SECONDS),
+            retries=settings.USER_SERVICE_RETRIES,
+            backoff_base=settings.USER_SERVICE_RETRY_BACKOFF_SECONDS,
+            backoff_max=settings.USER_SERVICE_RETRY_BACKOFF_MAX_SECONDS,
+            hedge_after=hedge_after / 1000 if hedge_after else None,
+        ),
+        timeout=httpx.Timeout(
+            settings.USER_SERVICE_READ_TIMEOUT,
+            connect=settings.USER_SERVICE_CONNECT_TIMEOUT,
+        ),
+    )
+
+# Dependency
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http_client
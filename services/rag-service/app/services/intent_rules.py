@@ -0,0 +1,247 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+from app.core.metrics import INTENT_RULE_LOOKUPS, INTENT_RULE_MATCHES
+from app.services.answer_cache import normalize_question
+
+# Columnas que se devuelven cuando la pregunta es sobre una persona concreta
+PERSON_COLUMNS = "id, primer_nombre, segundo_nombre, apellidos, fecha_nacimiento, genero, correo, celular, nro_documento, tipo_documento"
+NAME_COLUMNS = "primer_nombre, segundo_nombre, apellidos"
+MAX_LISTED = 50
+
+_SUBJECT = r"(?:empleados|empleadas|personas|trabajadores|trabajadoras|funcionarios|registros)"
+_GENERO_WORDS = {
+    "MASCULINO": r"(?:hombres|hombre|masculinos|masculino|varones)",
+    "FEMENINO": r"(?:mujeres|mujer|femeninas|femenina|femeninos|femenino)",
+    "NO_BINARIO": r"(?:no binarios|no binarias|no binario|no binaria)",
+}
+GENERO_LABELS = {
+    "MASCULINO": "masculino",
+    "FEMENINO": "femenino",
+    "NO_BINARIO": "no binario",
+    "PREFIERO_NO_REPORTAR": "prefiere no reportar",
+}
+# Si la pregunta menciona otros campos no se trata como un simple listado
+_OTHER_FIELDS = re.compile(r"\b(correo|correos|email|celular|celulares|telefono|telefonos|documento|documentos|cedula|edad|genero|fecha)\b")
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+# El apellido debe ir en mayúscula inicial para no confundirlo con otras palabras
+_SURNAME = re.compile(r"\b[Aa]pellid[oa]s?\s+(?:de\s+)?([A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+)\b")
+
+
+@dataclass
+class IntentMatch:
+    intent: str
+    sql: str
+    params: Dict[str, Any]
+    render: Callable[[List[Dict[str, Any]]], str]
+
+
+def _plural(n: int, singular: str, plural: str) -> str:
+    return singular if n == 1 else plural
+
+
+def full_name(row: Dict[str, Any]) -> str:
+    return " ".join(str(row[key]) for key in ("primer_nombre", "segundo_nombre", "apellidos") if row.get(key))
+
+
+def _name_list(rows: List[Dict[str, Any]]) -> str:
+    names = ", ".join(full_name(row) for row in rows[:MAX_LISTED])
+    if len(rows) > MAX_LISTED:
+        names += f" y {len(rows) - MAX_LISTED} más"
+    return names
+
+
+def _person_details(row: Dict[str, Any]) -> str:
+    return (
+        f"{full_name(row)}: correo {row.get('correo')}, celular {row.get('celular')}, "
+        f"{row.get('tipo_documento')} {row.get('nro_documento')}, "
+        f"nacido(a) el {row.get('fecha_nacimiento')}, género {GENERO_LABELS.get(row.get('genero'), row.get('genero'))}"
+    )
+
+
+def _count(rows: List[Dict[str, Any]]) -> int:
+    return int(next(iter(rows[0].values()))) if rows else 0
+
+
+def _genero_from(text: str) -> Optional[str]:
+    for genero, pattern in _GENERO_WORDS.items():
+        if re.search(rf"\b{pattern}\b", text):
+            return genero
+    return None
+
+
+def _count_total(text: str, question: str) -> Optional[IntentMatch]:
+    if not re.fullmatch(rf"cuant[oa]s {_SUBJECT}( (hay|existen|tenemos|son))?( registrad[oa]s)?( en total)?( en la (base de datos|empresa))?", text):
+        return None
+
+    def render(rows):
+        n = _count(rows)
+        return f"Hay {n} {_plural(n, 'empleado registrado', 'empleados registrados')}."
+    return IntentMatch("count_total", "SELECT COUNT(*) AS total FROM personas", {}, render)
+
+
+def _count_by_genero(text: str, question: str) -> Optional[IntentMatch]:
+    genero_words = "|".join(_GENERO_WORDS.values())
+    if not re.fullmatch(
+        rf"cuant[oa]s (({_SUBJECT} )?(son |hay )?({genero_words})|{_SUBJECT} de genero \w+( \w+)?)( (hay|existen|tenemos))?( registrad[oa]s)?",
+        text,
+    ):
+        return None
+    genero = _genero_from(text)
+    if genero is None:
+        return None
+
+    def render(rows):
+        n = _count(rows)
+        return f"Hay {n} {_plural(n, 'empleado', 'empleados')} de género {GENERO_LABELS[genero]}."
+    return IntentMatch(
+        "count_by_genero",
+        "SELECT COUNT(*) AS total FROM personas WHERE genero = :genero",
+        {"genero": genero},
+        render,
+    )
+
+
+def _count_group_by_genero(text: str, question: str) -> Optional[IntentMatch]:
+    if not re.fullmatch(rf"(cuant[oa]s {_SUBJECT} (hay )?(por|de cada) genero|distribucion (de {_SUBJECT} )?por genero)", text):
+        return None
+
+    def render(rows):
+        if not rows:
+            return "No hay empleados registrados."
+        parts = ", ".join(f"{GENERO_LABELS.get(row['genero'], row['genero'])}: {row['total']}" for row in rows)
+        return f"Distribución de empleados por género: {parts}."
+    return IntentMatch(
+        "count_group_by_genero",
+        "SELECT genero, COUNT(*) AS total FROM personas GROUP BY genero ORDER BY total DESC",
+        {},
+        render,
+    )
+
+
+def _born_in_year(text: str, question: str) -> Optional[IntentMatch]:
+    match = re.fullmatch(
+        rf"(cuant[oa]s|quien(es)?|que {_SUBJECT}|(lista(r|me)?|muestra(me)?|dame)( a)?( los| las)? {_SUBJECT}|{_SUBJECT})"
+        rf"( {_SUBJECT})?( que)? (nacieron|nacio|nacidos|nacidas|nacido|nacida) en (el )?(ano )?(\d{{4}})",
+        text,
+    )
+    if not match:
+        return None
+    year = int(match.group(match.lastindex))
+
+    if text.startswith("cuant"):
+        def render_count(rows):
+            n = _count(rows)
+            return f"{n} {_plural(n, 'empleado nació', 'empleados nacieron')} en {year}."
+        return IntentMatch(
+            "count_born_in_year",
+            "SELECT COUNT(*) AS total FROM personas WHERE EXTRACT(YEAR FROM fecha_nacimiento) = :anio",
+            {"anio": year},
+            render_count,
+        )
+
+    def render_list(rows):
+        if not rows:
+            return f"No hay empleados nacidos en {year}."
+        return f"{_plural(len(rows), 'Nació', 'Nacieron')} en {year} {len(rows)} {_plural(len(rows), 'empleado', 'empleados')}: {_name_list(rows)}."
+    return IntentMatch(
+        "list_born_in_year",
+        f"SELECT {NAME_COLUMNS}, fecha_nacimiento FROM personas WHERE EXTRACT(YEAR FROM fecha_nacimiento) = :anio ORDER BY fecha_nacimiento",
+        {"anio": year},
+        render_list,
+    )
+
+
+def _lookup_by_documento(text: str, question: str) -> Optional[IntentMatch]:
+    if text.startswith("cuant") or not re.search(r"\b(documento|cedula|identificacion|tarjeta de identidad)\b", text):
+        return None
+    numbers = re.findall(r"\b\d{5,15}\b", text)
+    if len(numbers) != 1:
+        return None
+    documento = numbers[0]
+
+    def render(rows):
+        if not rows:
+            return f"No se encontró ningún empleado con el documento {documento}."
+        return "; ".join(_person_details(row) for row in rows) + "."
+    return IntentMatch(
+        "lookup_by_documento",
+        f"SELECT {PERSON_COLUMNS} FROM personas WHERE nro_documento = :documento",
+        {"documento": documento},
+        render,
+    )
+
+
+def _lookup_by_correo(text: str, question: str) -> Optional[IntentMatch]:
+    emails = _EMAIL.findall(question)
+    if text.startswith("cuant") or len(emails) != 1:
+        return None
+    correo = emails[0].lower().rstrip(".")
+
+    def render(rows):
+        if not rows:
+            return f"No se encontró ningún empleado con el correo {correo}."
+        return "; ".join(_person_details(row) for row in rows) + "."
+    return IntentMatch(
+        "lookup_by_correo",
+        f"SELECT {PERSON_COLUMNS} FROM personas WHERE LOWER(correo) = :correo",
+        {"correo": correo},
+        render,
+    )
+
+
+def _by_surname(text: str, question: str) -> Optional[IntentMatch]:
+    match = _SURNAME.search(question)
+    if not match or _OTHER_FIELDS.search(text):
+        return None
+    if not re.match(rf"(cuant[oa]s|quien(es)?|que|cuales|lista\w*|muestra\w*|dame|{_SUBJECT})\b", text):
+        return None
+    apellido = match.group(1)
+
+    if text.startswith("cuant"):
+        def render_count(rows):
+            n = _count(rows)
+            return f"Hay {n} {_plural(n, 'empleado', 'empleados')} con apellido {apellido}."
+        return IntentMatch(
+            "count_by_surname",
+            "SELECT COUNT(*) AS total FROM personas WHERE apellidos ILIKE :apellido",
+            {"apellido": f"%{apellido}%"},
+            render_count,
+        )
+
+    def render_list(rows):
+        if not rows:
+            return f"No hay empleados con apellido {apellido}."
+        return f"{_plural(len(rows), 'Hay 1 empleado', f'Hay {len(rows)} empleados')} con apellido {apellido}: {_name_list(rows)}."
+    return IntentMatch(
+        "list_by_surname",
+        f"SELECT {NAME_COLUMNS} FROM personas WHERE apellidos ILIKE :apellido ORDER BY apellidos, primer_nombre",
+        {"apellido": f"%{apellido}%"},
+        render_list,
+    )
+
+
+# Orden de evaluación: de la regla más específica a la más general
+RULES = (
+    _lookup_by_correo,
+    _lookup_by_documento,
+    _born_in_year,
+    _count_group_by_genero,
+    _count_by_genero,
+    _count_total,
+    _by_surname,
+)
+
+
+def match_intent(question: str) -> Optional[IntentMatch]:
+    """Map a common Spanish question straight to SQL and an answer template, or None to use the LLM"""
+    INTENT_RULE_LOOKUPS.inc()
+    text = normalize_question(question)
+    for rule in RULES:
+        intent = rule(text, question)
+        if intent is not None:
+            INTENT_RULE_MATCHES.labels(intent=intent.intent).inc()
+            return intent
+    INTENT_RULE_MATCHES.labels(intent="none").inc()
+    return None
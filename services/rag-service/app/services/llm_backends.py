@@ -0,0 +1,215 @@
+import asyncio
+import itertools
+import json
+import logging
+import math
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.services.prompt_encoding import estimate_tokens
+
+# Respuestas del stub cuando ninguna regla del guion coincide
+DEFAULT_STUB_SQL = "SELECT COUNT(*) AS total FROM personas"
+DEFAULT_STUB_ANSWER = "Respuesta de prueba generada por el modelo local."
+_SQL_PROMPT = re.compile(r"generes una consulta SQL", re.IGNORECASE)
+_MISSING_CACHE = re.compile(r"not found|expired|does not exist", re.IGNORECASE)
+
+
+class CachedContentMissingError(LookupError):
+    """Raised by the stub when a cached content handle is unknown or was deleted"""
+
+
+def is_missing_cache(error: BaseException) -> bool:
+    """
+    True when the provider rejected a cached content handle as unknown or
+    expired; other failures (429, 5xx, timeouts) leave the handle usable.
+    """
+    if isinstance(error, CachedContentMissingError):
+        return True
+    code = getattr(error, "code", None)
+    message = str(getattr(error, "message", None) or error)
+    return code in (400, 403, 404) and "cache" in message.lower() and _MISSING_CACHE.search(message) is not None
+
+
+@dataclass
+class Usage:
+    prompt_token_count: Optional[int] = None
+    candidates_token_count: Optional[int] = None
+    cached_content_token_count: Optional[int] = None
+
+
+@dataclass
+class Completion:
+    """Backend-neutral response; mirrors the fields read from Gemini responses"""
+    text: Optional[str]
+    usage_metadata: Optional[Usage] = None
+
+
+class GeminiBackend:
+    """Calls the Gemini API through the async google-genai client"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str):
+        from google import genai
+        from google.genai import types
+
+        self._client = genai.Client(api_key=api_key)
+        self._types = types
+
+    def _config(self, cached_content: Optional[str]) -> Any:
+        return self._types.GenerateContentConfig(cached_content=cached_content) if cached_content else None
+
+    async def generate(self, model: str, contents: str, cached_content: Optional[str] = None) -> Any:
+        return await self._client.aio.models.generate_content(
+            model=model,
+            contents=contents,
+            config=self._config(cached_content),
+        )
+
+    async def stream(self, model: str, contents: str, cached_content: Optional[str] = None) -> AsyncIterator[Any]:
+        stream = await self._client.aio.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=self._config(cached_content),
+        )
+        async for chunk in stream:
+            yield chunk
+
+    async def create_cache(self, model: str, contents: str, ttl_seconds: float) -> str:
+        cache = await self._client.aio.caches.create(
+            model=model,
+            config=self._types.CreateCachedContentConfig(contents=[contents], ttl=f"{int(ttl_seconds)}s"),
+        )
+        return cache.name
+
+    async def refresh_cache(self, name: str, ttl_seconds: float) -> None:
+        await self._client.aio.caches.update(
+            name=name,
+            config=self._types.UpdateCachedContentConfig(ttl=f"{int(ttl_seconds)}s"),
+        )
+
+    async def delete_cache(self, name: str) -> None:
+        await self._client.aio.caches.delete(name=name)
+
+
+class StubBackend:
+    """
+    Local stand-in for the model, for running and load-testing the service
+    without an API key or network.
+
+    Each call sleeps for a latency drawn from a log-normal distribution with
+    median `latency_ms` and shape `latency_sigma` (0 gives a fixed latency),
+    using a seeded generator so runs are reproducible. Streaming splits the
+    answer into `chunk_chars` pieces spaced `chunk_delay_ms` apart.
+
+    Responses come from a JSON script, a list of `{"pattern", "response"}`
+    objects where the first regex found in the prompt wins. Unmatched SQL
+    prompts get `DEFAULT_STUB_SQL`, anything else `DEFAULT_STUB_ANSWER`.
+
+    Cached content is kept in memory, so prompt caching can be exercised too;
+    cached tokens are reported like Gemini does.
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        latency_ms: float = 200.0,
+        latency_sigma: float = 0.0,
+        chunk_chars: int = 16,
+        chunk_delay_ms: float = 20.0,
+        script_path: Optional[str] = None,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.chunk_chars = max(1, chunk_chars)
+        self.chunk_delay_ms = chunk_delay_ms
+        self._random = random.Random(seed)
+        self._script = load_script(script_path) if script_path else []
+        self._caches: Dict[str, str] = {}
+        self._cache_ids = itertools.count(1)
+
+    async def generate(self, model: str, contents: str, cached_content: Optional[str] = None) -> Completion:
+        await asyncio.sleep(self._latency())
+        cached = self._cached(cached_content)
+        text = self.respond(cached + contents)
+        return Completion(text, self._usage(cached, contents, text))
+
+    async def stream(self, model: str, contents: str, cached_content: Optional[str] = None) -> AsyncIterator[Completion]:
+        await asyncio.sleep(self._latency())
+        cached = self._cached(cached_content)
+        text = self.respond(cached + contents)
+        pieces = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(self.chunk_delay_ms / 1000)
+            # Como en Gemini, el uso de tokens llega con la última parte
+            usage = self._usage(cached, contents, text) if i == len(pieces) - 1 else None
+            yield Completion(piece, usage)
+
+    async def create_cache(self, model: str, contents: str, ttl_seconds: float) -> str:
+        name = f"cachedContents/stub-{next(self._cache_ids)}"
+        self._caches[name] = contents
+        return name
+
+    async def refresh_cache(self, name: str, ttl_seconds: float) -> None:
+        self._cached(name)
+
+    async def delete_cache(self, name: str) -> None:
+        self._caches.pop(name, None)
+
+    def _cached(self, name: Optional[str]) -> str:
+        if name is None:
+            return ""
+        if name not in self._caches:
+            raise CachedContentMissingError(f"Cached content {name} not found")
+        return self._caches[name]
+
+    def respond(self, contents: str) -> str:
+        for pattern, response in self._script:
+            if pattern.search(contents):
+                return response
+        return DEFAULT_STUB_SQL if _SQL_PROMPT.search(contents) else DEFAULT_STUB_ANSWER
+
+    def _latency(self) -> float:
+        if self.latency_sigma <= 0:
+            return self.latency_ms / 1000
+        return self._random.lognormvariate(math.log(max(self.latency_ms, 1e-3)), self.latency_sigma) / 1000
+
+    @staticmethod
+    def _usage(cached: str, contents: str, text: str) -> Usage:
+        return Usage(
+            prompt_token_count=estimate_tokens(cached + contents),
+            candidates_token_count=estimate_tokens(text),
+            cached_content_token_count=estimate_tokens(cached) if cached else None,
+        )
+
+
+def load_script(path: str) -> List[Tuple["re.Pattern[str]", str]]:
+    with open(path) as f:
+        entries = json.load(f)
+    script = []
+    for entry in entries:
+        script.append((re.compile(entry["pattern"], re.IGNORECASE | re.DOTALL), entry["response"]))
+    logging.info(f"Loaded {len(script)} scripted LLM responses from {path}")
+    return script
+
+
+def create_backend(settings) -> Any:
+    if settings.LLM_BACKEND == "stub":
+        return StubBackend(
+            latency_ms=settings.LLM_STUB_LATENCY_MS,
+            latency_sigma=settings.LLM_STUB_LATENCY_SIGMA,
+            chunk_chars=settings.LLM_STUB_CHUNK_CHARS,
+            chunk_delay_ms=settings.LLM_STUB_CHUNK_DELAY_MS,
+            script_path=settings.LLM_STUB_SCRIPT,
+            seed=settings.LLM_STUB_SEED,
+        )
+    if settings.LLM_BACKEND == "gemini":
+        if not settings.GOOGLE_API_KEY:
+            raise ValueError("GOOGLE_API_KEY is required when LLM_BACKEND=gemini")
+        return GeminiBackend(settings.GOOGLE_API_KEY)
+    raise ValueError(f"Unknown LLM_BACKEND {settings.LLM_BACKEND!r}, expected 'gemini' or 'stub'")
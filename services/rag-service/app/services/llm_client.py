@@ -0,0 +1,269 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import (
+    LLM_CALLS,
+    LLM_CALL_DURATION,
+    LLM_PROMPT_CHARS,
+    LLM_QUEUE_WAIT,
+    LLM_TIME_TO_FIRST_TOKEN,
+    LLM_TOKENS,
+)
+from app.services.llm_backends import create_backend, is_missing_cache
+from app.services.prompt_cache import PromptCache, PromptPrefix
+from app.utils.logger import APILogger, get_request_id
+
+
+class LLMQueueFullError(Exception):
+    """Raised when too many calls are already waiting for a free slot"""
+
+
+def _outcome(error: Optional[BaseException]) -> str:
+    if error is None:
+        return "ok"
+    if isinstance(error, LLMQueueFullError):
+        return "rejected"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    return "error"
+
+
+class LLMClient:
+    """
+    Async wrapper around the configured model backend, shared by every endpoint.
+
+    At most `max_concurrency` calls run at the same time, at most `max_queue`
+    more wait for a slot, and each call (queue time included) must finish
+    within `timeout` seconds. Every call is logged with the current request
+    id and recorded in the LLM metrics.
+
+    Calls may pass a `prefix`: with a `prompt_cache` it is uploaded once as
+    cached content and referenced by handle, otherwise it is prepended to
+    `contents` as before.
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        model: str,
+        max_concurrency: int,
+        max_queue: int,
+        timeout: float,
+        prompt_cache: Optional[PromptCache] = None,
+    ):
+        self.backend = backend
+        self.prompt_cache = prompt_cache
+        self.model = model
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    async def generate(
+        self,
+        contents: str,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        prefix: Optional[PromptPrefix] = None,
+    ) -> Optional[str]:
+        """Generate a completion without blocking the event loop"""
+        model = model or self.model
+        request_id = get_request_id()
+        APILogger.log_ai_request(request_id, contents, model=model, parameters=self._parameters(False, prefix))
+        started = time.perf_counter()
+        response = None
+        prompt = contents
+        error = None
+        try:
+            response, prompt = await asyncio.wait_for(
+                self._generate(contents, model, prefix),
+                timeout=timeout or self.timeout,
+            )
+            return response.text
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._record(
+                request_id, "generate", model, prompt, started, error,
+                response_text=response.text if response is not None else None,
+                usage=getattr(response, "usage_metadata", None),
+            )
+
+    async def generate_stream(
+        self,
+        contents: str,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        prefix: Optional[PromptPrefix] = None,
+    ) -> AsyncIterator[str]:
+        """Yield completion text chunks as they arrive; the deadline covers the whole stream"""
+        model = model or self.model
+        request_id = get_request_id()
+        APILogger.log_ai_request(request_id, contents, model=model, parameters=self._parameters(True, prefix))
+        started = time.perf_counter()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        first_token_at = None
+        usage = None
+        chunks = []
+        prompt = contents
+        error = None
+        try:
+            await asyncio.wait_for(self._acquire(), timeout=deadline - time.monotonic())
+            try:
+                prompt, cached_content = await asyncio.wait_for(
+                    self._apply_prefix(contents, model, prefix),
+                    timeout=deadline - time.monotonic(),
+                )
+            except BaseException:
+                self._semaphore.release()
+                raise
+            stream = self.backend.stream(model, prompt, cached_content)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    # La última parte trae el uso acumulado de tokens
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    if chunk.text:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        chunks.append(chunk.text)
+                        yield chunk.text
+            except Exception as e:
+                self._forget_prefix(model, prefix, cached_content, e)
+                raise
+            finally:
+                self._semaphore.release()
+                await stream.aclose()
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if first_token_at is not None:
+                LLM_TIME_TO_FIRST_TOKEN.labels(model=model).observe(first_token_at - started)
+            self._record(
+                request_id, "generate_stream", model, prompt, started, error,
+                response_text="".join(chunks), usage=usage,
+                time_to_first_token=first_token_at - started if first_token_at is not None else None,
+            )
+
+    def _record(
+        self,
+        request_id: Optional[str],
+        operation: str,
+        model: str,
+        prompt: str,
+        started: float,
+        error: Optional[BaseException],
+        response_text: Optional[str] = None,
+        usage: Any = None,
+        time_to_first_token: Optional[float] = None,
+    ) -> None:
+        # `prompt` es el texto enviado en línea: sin el prefijo cuando va como contenido cacheado
+        elapsed = time.perf_counter() - started
+        outcome = _outcome(error)
+        input_tokens = getattr(usage, "prompt_token_count", None)
+        output_tokens = getattr(usage, "candidates_token_count", None)
+        cached_tokens = getattr(usage, "cached_content_token_count", None)
+
+        LLM_CALLS.labels(model=model, operation=operation, outcome=outcome).inc()
+        LLM_CALL_DURATION.labels(model=model, operation=operation, outcome=outcome).observe(elapsed)
+        LLM_PROMPT_CHARS.labels(model=model).observe(len(prompt))
+        if input_tokens:
+            LLM_TOKENS.labels(model=model, direction="input").inc(input_tokens)
+        if output_tokens:
+            LLM_TOKENS.labels(model=model, direction="output").inc(output_tokens)
+        if cached_tokens:
+            LLM_TOKENS.labels(model=model, direction="cached").inc(cached_tokens)
+
+        APILogger.log_ai_response(
+            request_id,
+            response_text if error is None else f"{type(error).__name__}: {error}",
+            processing_time=elapsed,
+            model=model,
+            outcome=outcome,
+            prompt_chars=len(prompt),
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            time_to_first_token=time_to_first_token,
+        )
+
+    async def _acquire(self) -> None:
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            raise LLMQueueFullError(f"LLM queue is full ({self._waiting} calls waiting)")
+
+        started = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+            LLM_QUEUE_WAIT.observe(time.perf_counter() - started)
+
+    @staticmethod
+    def _parameters(stream: bool, prefix: Optional[PromptPrefix]) -> dict:
+        parameters = {"stream": stream}
+        if prefix is not None:
+            parameters["prefix"] = prefix.slot
+        return parameters
+
+    async def _apply_prefix(self, contents: str, model: str, prefix: Optional[PromptPrefix]):
+        """Return (contents, cached content handle) for the call"""
+        if prefix is None:
+            return contents, None
+        if self.prompt_cache is not None:
+            cached_content = await self.prompt_cache.handle(model, prefix)
+            if cached_content is not None:
+                return contents, cached_content
+        return prefix.build() + contents, None
+
+    def _forget_prefix(
+        self,
+        model: str,
+        prefix: Optional[PromptPrefix],
+        cached_content: Optional[str],
+        error: BaseException,
+    ) -> None:
+        # Un handle caducado o borrado en el proveedor se recrea en la próxima
+        # llamada; ante otros errores (429, 5xx) sigue siendo válido
+        if cached_content is not None and self.prompt_cache is not None and is_missing_cache(error):
+            self.prompt_cache.invalidate(model, prefix)
+
+    async def _generate(self, contents: str, model: str, prefix: Optional[PromptPrefix] = None) -> Tuple[Any, str]:
+        """Return the response and the prompt text actually sent with it"""
+        await self._acquire()
+        cached_content = None
+        try:
+            contents, cached_content = await self._apply_prefix(contents, model, prefix)
+            return await self.backend.generate(model, contents, cached_content), contents
+        except Exception as e:
+            self._forget_prefix(model, prefix, cached_content, e)
+            raise
+        finally:
+            self._semaphore.release()
+
+
+_backend = create_backend(settings)
+llm_client = LLMClient(
+    backend=_backend,
+    model=settings.GEMINI_MODEL,
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    max_queue=settings.LLM_MAX_QUEUE,
+    timeout=settings.LLM_TIMEOUT_SECONDS,
+    prompt_cache=PromptCache(
+        _backend,
+        ttl_seconds=settings.PROMPT_CACHE_TTL_SECONDS,
+        min_tokens=settings.PROMPT_CACHE_MIN_TOKENS,
+        refresh_margin_seconds=settings.PROMPT_CACHE_REFRESH_MARGIN_SECONDS,
+    ) if settings.PROMPT_CACHE_ENABLED else None,
+)
@@ -0,0 +1,115 @@
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from app.core.metrics import REPLICA_AGE, REPLICA_CHANGES, REPLICA_SYNCS
+from app.services.user_service import get_persona_changes
+
+
+@dataclass(frozen=True)
+class Delta:
+    """What one sync changed; `full` means `changed` is the whole table"""
+    changed: List[Dict[str, Any]]
+    deleted: List[Any]
+    full: bool
+
+
+class PersonaReplica:
+    """
+    Sync position of the local personas copy (the rows live in the persona
+    index). The first sync loads every row; later syncs ask user-service
+    only for rows written and ids deleted since the last watermark (minus a
+    small overlap, so transactions that committed late are not missed).
+    Pages are read in order by keyset against a fixed `until`, so a row
+    written during a sync cannot shift the others out of it; each sync
+    returns a Delta for the caller to apply.
+
+    The replica counts as fresh while it matches the current data version
+    and is younger than `max_staleness` seconds; the age bound also picks up
+    writes made without going through user-service. If a sync fails, the
+    last copy keeps being served. `state()` and `restore()` carry the
+    position across restarts, next to the persisted index.
+    """
+
+    def __init__(self, page_size: int, max_staleness: float, overlap: float):
+        self.page_size = max(1, page_size)
+        self.max_staleness = max_staleness
+        self.overlap = overlap
+        self.version: Optional[str] = None
+        self.watermark: Optional[str] = None
+        self.synced_at: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.synced_at is not None
+
+    def state(self) -> Dict[str, Any]:
+        """Sync position to persist; the sync time is stored as wall-clock time"""
+        return {
+            "version": self.version,
+            "watermark": self.watermark,
+            "synced_at": time.time() - self.age() if self.loaded else None,
+        }
+
+    def restore(self, state: Optional[Dict[str, Any]]) -> bool:
+        """Resume from a persisted position, so a restart syncs a delta instead of the whole table"""
+        if not state or not state.get("watermark") or state.get("synced_at") is None:
+            return False
+        self.version = state.get("version")
+        self.watermark = state["watermark"]
+        self.synced_at = time.monotonic() - max(time.time() - state["synced_at"], 0.0)
+        return True
+
+    def age(self) -> float:
+        age = time.monotonic() - self.synced_at if self.synced_at is not None else float("inf")
+        if self.synced_at is not None:
+            REPLICA_AGE.set(age)
+        return age
+
+    def is_fresh(self, data_version: Optional[str]) -> bool:
+        if not self.loaded or self.age() >= self.max_staleness:
+            return False
+        return data_version is None or data_version == self.version
+
+    def _since(self) -> Optional[str]:
+        if self.watermark is None:
+            return None
+        watermark = datetime.fromisoformat(self.watermark)
+        return (watermark - timedelta(seconds=self.overlap)).isoformat()
+
+    async def _fetch(self, client: httpx.AsyncClient, since: Optional[str]) -> Tuple[List[Dict[str, Any]], List[Any], str]:
+        first = await get_persona_changes(client, since=since, limit=self.page_size)
+        watermark = first["watermark"]
+        rows = list(first["rows"])
+        after = first["next"]
+        while after is not None:
+            changes = await get_persona_changes(client, since=since, until=watermark, after=after, limit=self.page_size)
+            rows.extend(changes["rows"])
+            after = changes["next"]
+        return rows, first["deleted"], watermark
+
+    async def refresh(self, client: httpx.AsyncClient, data_version: Optional[str]) -> Optional[Delta]:
+        """
+        Sync with user-service; returns what changed, or None when the sync
+        failed and the previous snapshot is still being served
+        """
+        since = self._since()
+        mode = "full" if since is None else "delta"
+        try:
+            rows, deleted, watermark = await self._fetch(client, since)
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            REPLICA_SYNCS.labels(mode=mode, outcome="error").inc()
+            if not self.loaded:
+                raise
+            logging.warning(f"Could not sync personas replica, serving data {self.age():.0f}s old: {str(e)}")
+            return None
+
+        self.synced_at = time.monotonic()
+        self.version = data_version
+        self.watermark = watermark
+        REPLICA_SYNCS.labels(mode=mode, outcome="ok").inc()
+        REPLICA_CHANGES.labels(change="upserted").inc(len(rows))
+        REPLICA_CHANGES.labels(change="deleted").inc(len(deleted))
+        return Delta(changed=rows, deleted=deleted, full=since is None)
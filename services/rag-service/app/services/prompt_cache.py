@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+from app.core.metrics import PROMPT_CACHE_EVENTS
+from app.services.llm_backends import is_missing_cache
+from app.services.prompt_encoding import estimate_tokens
+
+
+@dataclass(frozen=True)
+class PromptPrefix:
+    """
+    Stable leading part of a prompt. `slot` names the kind of prefix (one
+    live cache per slot and model), `version` changes whenever the text does,
+    and `build` renders the text only when it is actually needed.
+    """
+    slot: str
+    version: Optional[str]
+    build: Callable[[], str]
+
+
+def static_prefix(slot: str, text: str) -> PromptPrefix:
+    return PromptPrefix(slot, hashlib.sha1(text.encode()).hexdigest()[:16], lambda: text)
+
+
+@dataclass
+class _Entry:
+    version: str
+    name: Optional[str]  # None cuando el prefijo es muy corto para cachearlo
+    expires_at: float
+
+
+class PromptCache:
+    """
+    Keeps prompt prefixes uploaded to the provider as cached content, so
+    later calls send only the variable part and reference the prefix by
+    handle. A handle is reused while its version matches; when it is used
+    close to expiry its TTL is extended, and when the version changes (new
+    schema, new data version) a new cache replaces it and the old one is
+    deleted. Any failure just means the prefix is sent inline.
+    """
+
+    def __init__(self, backend: Any, ttl_seconds: float, min_tokens: int, refresh_margin_seconds: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        # Referencias a los borrados en curso, para que no se recolecten antes de terminar
+        self._deletions: Set[asyncio.Task] = set()
+
+    def _usable(self, entry: Optional[_Entry], version: str) -> bool:
+        if entry is None or entry.version != version:
+            return False
+        return entry.name is None or entry.expires_at - self.refresh_margin_seconds > time.monotonic()
+
+    async def handle(self, model: str, prefix: PromptPrefix) -> Optional[str]:
+        """Cached content name for `prefix`, or None if it must be sent inline"""
+        if prefix.version is None:
+            return None
+        key = (prefix.slot, model)
+        entry = self._entries.get(key)
+        if self._usable(entry, prefix.version):
+            PROMPT_CACHE_EVENTS.labels(slot=prefix.slot, event="hit" if entry.name else "inline").inc()
+            return entry.name
+
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            entry = self._entries.get(key)
+            if self._usable(entry, prefix.version):
+                PROMPT_CACHE_EVENTS.labels(slot=prefix.slot, event="hit" if entry.name else "inline").inc()
+                return entry.name
+
+            now = time.monotonic()
+            if entry is not None and entry.version == prefix.version and entry.name and entry.expires_at > now:
+                try:
+                    await self.backend.refresh_cache(entry.name, self.ttl_seconds)
+                    entry.expires_at = now + self.ttl_seconds
+                    PROMPT_CACHE_EVENTS.labels(slot=prefix.slot, event="refreshed").inc()
+                    return entry.name
+                except Exception as e:
+                    logging.warning(f"Could not extend prompt cache {entry.name}: {str(e)}")
+                    if not is_missing_cache(e):
+                        # Un fallo pasajero: el handle sigue vivo hasta que caduque
+                        PROMPT_CACHE_EVENTS.labels(slot=prefix.slot, event="hit").inc()
+                        return entry.name
+
+            text = prefix.build()
+            if estimate_tokens(text) < self.min_tokens:
+                self._replace(key, _Entry(prefix.version, None, math.inf))
+                PROMPT_CACHE_EVENTS.labels(slot=prefix.slot, event="inline").inc()
+                return None
+            try:
+                name = await self.backend.create_cache(model, text, self.ttl_seconds)
+            except Exception as e:
+                PROMPT_CACHE_EVENTS.labels(slot=prefix.slot, event="error").inc()
+                logging.warning(f"Could not create prompt cache for {prefix.slot}: {str(e)}")
+                return None
+            self._replace(key, _Entry(prefix.version, name, now + self.ttl_seconds))
+            PROMPT_CACHE_EVENTS.labels(slot=prefix.slot, event="created").inc()
+            return name
+
+    def invalidate(self, model: str, prefix: PromptPrefix) -> None:
+        """Forget the handle of `prefix`, e.g. after the provider rejected it"""
+        self._replace((prefix.slot, model), None)
+
+    def _replace(self, key: Tuple[str, str], entry: Optional[_Entry]) -> None:
+        previous = self._entries.pop(key, None)
+        if entry is not None:
+            self._entries[key] = entry
+        if previous is not None and previous.name and (entry is None or entry.name != previous.name):
+            task = asyncio.create_task(self._delete(previous.name))
+            self._deletions.add(task)
+            task.add_done_callback(self._deletions.discard)
+
+    async def _delete(self, name: str) -> None:
+        try:
+            await self.backend.delete_cache(name)
+        except Exception as e:
+            # Si no se puede borrar, el TTL lo elimina igual
+            logging.warning(f"Could not delete prompt cache {name}: {str(e)}")
@@ -0,0 +1,128 @@
+import csv
+import io
+import math
+import re
+from typing import Any, Dict, List
+
+# Aproximación habitual para texto en español: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _format_value(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _csv_line(values: List[Any]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow([_format_value(value) for value in values])
+    return buffer.getvalue()
+
+
+def summarize_columns(rows: List[Dict[str, Any]], columns: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Min/max for numeric and date columns, distinct count for the rest"""
+    summary: Dict[str, Dict[str, Any]] = {}
+    for column in columns:
+        values = [row.get(column) for row in rows if row.get(column) is not None]
+        if not values:
+            summary[column] = {"nulls": len(rows)}
+            continue
+        nulls = len(rows) - len(values)
+        if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            summary[column] = {"min": min(values), "max": max(values)}
+        elif all(isinstance(value, str) and _ISO_DATE.match(value) for value in values):
+            summary[column] = {"min": min(values), "max": max(values)}
+        else:
+            summary[column] = {"distinct": len(set(map(str, values)))}
+        if nulls:
+            summary[column]["nulls"] = nulls
+    return summary
+
+
+def _columns(rows: List[Dict[str, Any]]) -> List[str]:
+    columns = list(rows[0].keys())
+    for row in rows[1:]:
+        columns.extend(key for key in row if key not in columns)
+    return columns
+
+
+def encode_results(results: Any, token_budget: int, partial: bool = False) -> Dict[str, Any]:
+    """
+    Render SQL results as CSV with a single header row, keeping as many rows
+    as fit in `token_budget`. When rows are dropped, a per-column summary of
+    the rows read is appended so the model still sees the overall shape.
+    `partial` means `results` are only the first rows of a larger result, so
+    the total is given to the model as a lower bound.
+    """
+    if not isinstance(results, list) or not all(isinstance(row, dict) for row in results):
+        text = str(results)
+        return {"text": text, "rows_total": None, "rows_included": None, "truncated": False, "estimated_tokens": estimate_tokens(text)}
+    if not results:
+        return {"text": "(sin filas)", "rows_total": 0, "rows_included": 0, "truncated": False, "estimated_tokens": 3}
+
+    columns = _columns(results)
+    header = _csv_line(columns)
+    row_lines = [_csv_line([row.get(column) for column in columns]) for row in results]
+    row_costs = [estimate_tokens(line) for line in row_lines]
+
+    budget = token_budget - estimate_tokens(header)
+    if sum(row_costs) > budget:
+        # Se deja espacio para el resumen que acompaña a las filas recortadas
+        budget -= estimate_tokens(str(summarize_columns(results[:1], columns))) * 2 + 20
+
+    lines = [header]
+    used = 0
+    for line, cost in zip(row_lines, row_costs):
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    included = len(lines) - 1
+
+    text = "".join(lines)
+    truncated = included < len(results) or partial
+    if partial:
+        text += f"... se muestran {included} filas de al menos {len(results) + 1} en total; el resultado se recortó.\n"
+    elif truncated:
+        text += f"... {len(results) - included} filas omitidas de {len(results)} en total.\n"
+    if included < len(results):
+        scope = f"las {len(results)} filas leídas" if partial else "todas las filas"
+        text += f"Resumen de {scope}: {summarize_columns(results, columns)}\n"
+    return {
+        "text": text,
+        "rows_total": len(results),
+        "rows_included": included,
+        "truncated": truncated,
+        "estimated_tokens": estimate_tokens(text),
+    }
+
+
+def shard_results(rows: List[Dict[str, Any]], token_budget: int) -> List[str]:
+    """
+    Split rows into CSV shards, each with the header row and at most
+    `token_budget` tokens; a row larger than the budget gets its own shard.
+    """
+    if not rows:
+        return []
+    columns = _columns(rows)
+    header = _csv_line(columns)
+    budget = token_budget - estimate_tokens(header)
+
+    shards = []
+    lines: List[str] = []
+    used = 0
+    for row in rows:
+        line = _csv_line([row.get(column) for column in columns])
+        cost = estimate_tokens(line)
+        if lines and used + cost > budget:
+            shards.append(header + "".join(lines))
+            lines, used = [], 0
+        lines.append(line)
+        used += cost
+    shards.append(header + "".join(lines))
+    return shards
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import random
+import time
+from contextvars import ContextVar
+from typing import Optional
+import httpx
+from fastapi import HTTPException, Request
+from app.core.metrics import (
+    USER_SERVICE_BREAKER_STATE,
+    USER_SERVICE_BREAKER_TRANSITIONS,
+    USER_SERVICE_HEDGES,
+    USER_SERVICE_REJECTED,
+    USER_SERVICE_RETRIES,
+)
+
+# Presupuesto restante de la petición en milisegundos; relativo para no
+# depender de que los relojes de los servicios estén sincronizados
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+# Respuestas de un user-service caído o saturado; se reintentan y abren el circuito
+UNAVAILABLE_STATUSES = {502, 503, 504}
+
+_deadline_var: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised without calling user-service while its circuit breaker is open"""
+
+
+class DeadlineExceededError(httpx.TimeoutException):
+    """Raised when the request deadline is spent before or during a call"""
+
+
+def set_deadline(seconds: Optional[float]) -> None:
+    _deadline_var.set(time.monotonic() + seconds if seconds is not None else None)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left for the current request, or None outside of a request"""
+    deadline = _deadline_var.get()
+    return deadline - time.monotonic() if deadline is not None else None
+
+
+def deadline_middleware(default_seconds: float):
+    """
+    Give each incoming request a deadline: the budget sent by the caller in
+    DEADLINE_HEADER, capped at `default_seconds`. Calls to user-service made
+    while handling it share what is left.
+    """
+    async def middleware(request: Request, call_next):
+        budget = default_seconds
+        header = request.headers.get(DEADLINE_HEADER)
+        if header:
+            try:
+                budget = min(budget, max(float(header), 0.0) / 1000)
+            except ValueError:
+                pass
+        set_deadline(budget)
+        return await call_next(request)
+    return middleware
+
+
+def upstream_error(error: httpx.HTTPError) -> HTTPException:
+    """HTTP error to return when a call to user-service could not complete"""
+    if isinstance(error, CircuitOpenError):
+        return HTTPException(status_code=503, detail=f"user-service unavailable: {str(error)}")
+    if isinstance(error, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail=f"user-service timed out: {str(error)}")
+    return HTTPException(status_code=502, detail=f"user-service error: {str(error)}")
+
+
+class CircuitBreaker:
+    """
+    Stops calling user-service after `failure_threshold` consecutive
+    failures. While open, calls fail at once; after `reset_seconds` one
+    probe is let through (half-open), and its outcome closes the circuit or
+    opens it again. A probe that never reports back is replaced by another
+    after `reset_seconds`.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._changed_at = time.monotonic()
+        USER_SERVICE_BREAKER_STATE.set(self._GAUGE[self.state])
+
+    def _transition(self, state: str) -> None:
+        self._changed_at = time.monotonic()
+        if state == self.state:
+            return
+        logging.warning(f"user-service circuit breaker {self.state} -> {state}")
+        self.state = state
+        USER_SERVICE_BREAKER_STATE.set(self._GAUGE[state])
+        USER_SERVICE_BREAKER_TRANSITIONS.labels(state=state).inc()
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if time.monotonic() - self._changed_at < self.reset_seconds:
+            return False
+        # Pasado el tiempo de espera se deja pasar una sola petición de prueba
+        self._transition(self.HALF_OPEN)
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._transition(self.OPEN)
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """
+    Transport for calls to user-service, wrapping the pooled HTTP transport:
+
+    - Every call gets the time left of the current request deadline, both
+      as its timeouts and in DEADLINE_HEADER so user-service can honour it.
+    - Idempotent reads (GET, or requests sent with the `idempotent`
+      extension) are retried up to `retries` times on connection errors,
+      timeouts and 502/503/504, with full-jitter exponential backoff.
+    - A CircuitBreaker fails calls fast while user-service is unhealthy.
+      Only upstream failures count towards it: transport errors,
+      502/503/504 and timeouts within the configured timeouts, not calls
+      cut short by the caller's own deadline.
+    - With `hedge_after` set, an idempotent read still pending after that
+      many seconds is sent a second time and the first answer wins.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        breaker: CircuitBreaker,
+        retries: int = 0,
+        backoff_base: float = 0.1,
+        backoff_max: float = 2.0,
+        hedge_after: Optional[float] = None,
+    ):
+        self.transport = transport
+        self.breaker = breaker
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+
+    @staticmethod
+    def _idempotent(request: httpx.Request) -> bool:
+        return request.method in ("GET", "HEAD") or bool(request.extensions.get("idempotent"))
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempts = 1 + (self.retries if self._idempotent(request) else 0)
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                response = await self._attempt(request)
+            except (CircuitOpenError, DeadlineExceededError):
+                raise
+            except httpx.TransportError as e:
+                if last:
+                    raise
+                reason = "timeout" if isinstance(e, httpx.TimeoutException) else "connection"
+            else:
+                if last or response.status_code not in UNAVAILABLE_STATUSES:
+                    return response
+                await response.aclose()
+                reason = f"status_{response.status_code}"
+
+            delay = self._backoff(attempt)
+            remaining = remaining_budget()
+            if remaining is not None and delay >= remaining:
+                USER_SERVICE_REJECTED.labels(reason="deadline").inc()
+                raise DeadlineExceededError("Request deadline exceeded before retrying", request=request)
+            USER_SERVICE_RETRIES.labels(reason=reason).inc()
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    async def _attempt(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            USER_SERVICE_REJECTED.labels(reason="circuit_open").inc()
+            raise CircuitOpenError("Circuit breaker is open", request=request)
+
+        remaining = remaining_budget()
+        # Con el presupuesto por debajo de los timeouts configurados, un
+        # timeout es culpa del plazo del llamador y no de user-service
+        clamped = False
+        if remaining is not None:
+            if remaining <= 0:
+                USER_SERVICE_REJECTED.labels(reason="deadline").inc()
+                raise DeadlineExceededError("Request deadline exceeded", request=request)
+            request.headers[DEADLINE_HEADER] = str(int(remaining * 1000))
+            timeouts = request.extensions.get("timeout", {})
+            clamped = any(value is None or value > remaining for value in timeouts.values())
+            request.extensions["timeout"] = {
+                key: remaining if value is None else min(value, remaining) for key, value in timeouts.items()
+            }
+
+        try:
+            if self.hedge_after is not None and self._idempotent(request) and self.breaker.state == CircuitBreaker.CLOSED:
+                response = await asyncio.wait_for(self._hedged(request), remaining)
+            else:
+                response = await asyncio.wait_for(self.transport.handle_async_request(request), remaining)
+        except asyncio.TimeoutError:
+            USER_SERVICE_REJECTED.labels(reason="deadline").inc()
+            raise DeadlineExceededError("Request deadline exceeded", request=request)
+        except httpx.TimeoutException as e:
+            if clamped:
+                USER_SERVICE_REJECTED.labels(reason="deadline").inc()
+                raise DeadlineExceededError("Request deadline exceeded", request=request) from e
+            self.breaker.record_failure()
+            raise
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+
+        if response.status_code in UNAVAILABLE_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def _hedged(self, request: httpx.Request) -> httpx.Response:
+        first = asyncio.ensure_future(self.transport.handle_async_request(request))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        USER_SERVICE_HEDGES.labels(outcome="sent").inc()
+        second = asyncio.ensure_future(self.transport.handle_async_request(request))
+        pending = {first, second}
+        winner: Optional[asyncio.Future] = None
+        try:
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                if winner is not None:
+                    if winner is second:
+                        USER_SERVICE_HEDGES.labels(outcome="won").inc()
+                    return winner.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            # Si ambas respondieron, se libera la conexión de la que no se usa
+            for task in (first, second):
+                if task is not winner and task.done() and not task.cancelled() and task.exception() is None:
+                    await task.result().aclose()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
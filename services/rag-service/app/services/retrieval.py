@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import re
+import zlib
+from datetime import date
+from typing import Any, Dict, List, Optional
+import httpx
+import numpy as np
+from app.core.config import settings
+from app.services.answer_cache import normalize_question
+from app.services.persona_replica import PersonaReplica
+from app.services.vector_store import load_index, open_vectors, save_index
+
+# Campos de texto que se indexan de cada persona
+TEXT_FIELDS = (
+    "primer_nombre", "segundo_nombre", "apellidos", "correo",
+    "nro_documento", "genero", "tipo_documento", "fecha_nacimiento",
+)
+
+GENERO_CODES = {"MASCULINO": 1, "FEMENINO": 2, "NO_BINARIO": 3, "PREFIERO_NO_REPORTAR": 4}
+TIPO_DOCUMENTO_CODES = {"CEDULA": 1, "TARJETA_DE_IDENTIDAD": 2, "TARJETA_IDENTIDAD": 2}
+
+_GENERO_PATTERNS = (
+    (re.compile(r"\bno binari[oa]s?\b"), "NO_BINARIO"),
+    (re.compile(r"\b(hombres?|masculinos?|varon|varones)\b"), "MASCULINO"),
+    (re.compile(r"\b(mujer|mujeres|femeninos?|femeninas?)\b"), "FEMENINO"),
+)
+_TIPO_DOCUMENTO_PATTERNS = (
+    (re.compile(r"\btarjetas? de identidad\b"), "TARJETA_DE_IDENTIDAD"),
+    (re.compile(r"\bcedulas?\b"), "CEDULA"),
+)
+_BORN_IN = re.compile(r"\bnacid[oa]s? en (\d{4})\b")
+_BORN_BEFORE = re.compile(r"\b(?:nacid[oa]s? )?antes (?:de|del) (\d{4})\b")
+_BORN_AFTER = re.compile(r"\b(?:nacid[oa]s? )?(?:despues|luego) (?:de|del) (\d{4})\b")
+
+
+def _features(text: str, dimension: int) -> np.ndarray:
+    """Hashed bag of words plus character trigrams, L2-normalized"""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in normalize_question(text).split():
+        vector[zlib.crc32(word.encode()) % dimension] += 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(padded[i:i + 3].encode()) % dimension] += 0.5
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _persona_text(persona: Dict[str, Any]) -> str:
+    return " ".join(str(persona.get(field) or "") for field in TEXT_FIELDS)
+
+
+def _birth_ordinal(value: Any) -> int:
+    try:
+        return date.fromisoformat(str(value)).toordinal()
+    except ValueError:
+        return -1
+
+
+def parse_filters(question: str) -> Dict[str, Any]:
+    """Extract structured filters (genero, tipo_documento, birth date range) from a Spanish question"""
+    text = normalize_question(question)
+    filters: Dict[str, Any] = {}
+
+    for pattern, genero in _GENERO_PATTERNS:
+        if pattern.search(text):
+            filters["genero"] = genero
+            break
+    for pattern, tipo_documento in _TIPO_DOCUMENTO_PATTERNS:
+        if pattern.search(text):
+            filters["tipo_documento"] = tipo_documento
+            break
+
+    if match := _BORN_IN.search(text):
+        year = int(match.group(1))
+        filters["born_from"] = date(year, 1, 1).toordinal()
+        filters["born_to"] = date(year, 12, 31).toordinal()
+    if match := _BORN_BEFORE.search(text):
+        filters["born_to"] = date(int(match.group(1)), 1, 1).toordinal() - 1
+    if match := _BORN_AFTER.search(text):
+        filters["born_from"] = date(int(match.group(1)), 12, 31).toordinal() + 1
+    return filters
+
+
+class PersonaIndex:
+    """
+    In-memory vector index over personas.
+
+    Each row holds hashed text features plus the structured columns used for
+    filtering. Rows are upserted by id and only re-encoded when their content
+    changes, so refreshing after a write touches just the affected personas.
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.version: Optional[str] = None
+        self._size = 0
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._genero = np.zeros(0, dtype=np.int8)
+        self._tipo_documento = np.zeros(0, dtype=np.int8)
+        self._birth = np.zeros(0, dtype=np.int32)
+        self._rows: List[Dict[str, Any]] = []
+        self._positions: Dict[Any, int] = {}
+        self._fingerprints: Dict[Any, str] = {}
+        self._idf: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    @property
+    def rows(self) -> List[Dict[str, Any]]:
+        return self._rows
+
+    def _grow(self, capacity: int) -> None:
+        if capacity <= len(self._vectors):
+            return
+        capacity = max(capacity, 2 * len(self._vectors), 64)
+        extra = capacity - len(self._vectors)
+        self._vectors = np.vstack([self._vectors, np.zeros((extra, self.dimension), dtype=np.float32)])
+        self._grow_columns(capacity)
+
+    def _grow_columns(self, capacity: int) -> None:
+        extra = capacity - len(self._genero)
+        if extra <= 0:
+            return
+        self._genero = np.concatenate([self._genero, np.zeros(extra, dtype=np.int8)])
+        self._tipo_documento = np.concatenate([self._tipo_documento, np.zeros(extra, dtype=np.int8)])
+        self._birth = np.concatenate([self._birth, np.full(extra, -1, dtype=np.int32)])
+
+    def _write_row(self, position: int, persona: Dict[str, Any], vector: Optional[np.ndarray] = None) -> None:
+        self._vectors[position] = _features(_persona_text(persona), self.dimension) if vector is None else vector
+        self._write_columns(position, persona)
+
+    def _write_columns(self, position: int, persona: Dict[str, Any]) -> None:
+        self._genero[position] = GENERO_CODES.get(str(persona.get("genero")), 0)
+        self._tipo_documento[position] = TIPO_DOCUMENTO_CODES.get(str(persona.get("tipo_documento")), 0)
+        self._birth[position] = _birth_ordinal(persona.get("fecha_nacimiento"))
+        self._rows[position] = persona
+        self._idf = None
+
+    def restore(self, vectors: np.ndarray, rows: List[Dict[str, Any]], version: Optional[str]) -> None:
+        """
+        Adopt already-encoded vectors (typically a memory-mapped file) for
+        `rows`. Nothing is re-encoded; only the structured columns are rebuilt.
+        """
+        if vectors.shape != (len(rows), self.dimension):
+            raise ValueError(f"Vector matrix shape {vectors.shape} does not match {len(rows)} rows of dimension {self.dimension}")
+        self._vectors = vectors
+        self._rows = list(rows)
+        self._size = len(rows)
+        self._genero = np.zeros(0, dtype=np.int8)
+        self._tipo_documento = np.zeros(0, dtype=np.int8)
+        self._birth = np.zeros(0, dtype=np.int32)
+        self._grow_columns(self._size)
+        self._positions = {}
+        self._fingerprints = {}
+        for position, persona in enumerate(self._rows):
+            self._write_columns(position, persona)
+            self._positions[persona.get("id")] = position
+            self._fingerprints[persona.get("id")] = _persona_text(persona)
+        self.version = version
+
+    def remap(self, vectors: np.ndarray) -> None:
+        """Swap in an identical copy of the vectors, e.g. the file that was just saved"""
+        if vectors.shape != self.vectors.shape:
+            raise ValueError(f"Vector matrix shape {vectors.shape} does not match {self.vectors.shape}")
+        self._vectors = vectors
+
+    def upsert(self, personas: List[Dict[str, Any]]) -> int:
+        """Insert new personas and re-encode changed ones; returns how many rows were encoded"""
+        encoded = 0
+        for persona in personas:
+            persona_id = persona.get("id")
+            fingerprint = _persona_text(persona)
+            if self._fingerprints.get(persona_id) == fingerprint:
+                self._rows[self._positions[persona_id]] = persona
+                continue
+
+            position = self._positions.get(persona_id)
+            if position is None:
+                self._grow(self._size + 1)
+                position = self._size
+                self._rows.append(persona)
+                self._positions[persona_id] = position
+                self._size += 1
+            self._write_row(position, persona)
+            self._fingerprints[persona_id] = fingerprint
+            encoded += 1
+        return encoded
+
+    def remove(self, persona_ids) -> None:
+        for persona_id in persona_ids:
+            position = self._positions.pop(persona_id, None)
+            self._fingerprints.pop(persona_id, None)
+            if position is None:
+                continue
+            last = self._size - 1
+            if position != last:
+                # Se mueve la última fila al hueco para mantener la matriz densa
+                moved = self._rows[last]
+                self._write_row(position, moved, self._vectors[last].copy())
+                self._positions[moved.get("id")] = position
+            self._rows.pop()
+            self._size -= 1
+            self._idf = None
+
+    def sync(self, personas: List[Dict[str, Any]], version: Optional[str] = None) -> int:
+        """Make the index match `personas` exactly, re-encoding only what changed"""
+        current_ids = {persona.get("id") for persona in personas}
+        self.remove([persona_id for persona_id in list(self._positions) if persona_id not in current_ids])
+        encoded = self.upsert(personas)
+        self.version = version
+        return encoded
+
+    def _mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        mask = np.ones(self._size, dtype=bool)
+        if "genero" in filters:
+            mask &= self._genero[:self._size] == GENERO_CODES[filters["genero"]]
+        if "tipo_documento" in filters:
+            mask &= self._tipo_documento[:self._size] == TIPO_DOCUMENTO_CODES[filters["tipo_documento"]]
+        if "born_from" in filters:
+            mask &= self._birth[:self._size] >= filters["born_from"]
+        if "born_to" in filters:
+            mask &= (self._birth[:self._size] >= 0) & (self._birth[:self._size] <= filters["born_to"])
+        return mask
+
+    def _inverse_frequencies(self) -> np.ndarray:
+        # Ponderación tipo IDF: los rasgos presentes en casi todas las filas pesan poco
+        if self._idf is None:
+            document_frequency = np.count_nonzero(self._vectors[:self._size], axis=0)
+            self._idf = np.log((1 + self._size) / (1 + document_frequency)).astype(np.float32)
+        return self._idf
+
+    def search(self, question: str, k: int) -> Dict[str, Any]:
+        """
+        Return the top-k personas for a question together with the total row
+        count and how many rows passed the structured filters.
+        """
+        filters = parse_filters(question)
+        if self._size == 0:
+            return {"rows": [], "total": 0, "matched": 0, "filters": filters}
+
+        mask = self._mask(filters)
+        matched = int(mask.sum())
+        vectors = self._vectors[:self._size]
+
+        scores = vectors @ (_features(question, self.dimension) * self._inverse_frequencies())
+        scores[~mask] = -np.inf
+
+        k = min(k, matched)
+        if k == 0:
+            return {"rows": [], "total": self._size, "matched": 0, "filters": filters}
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return {
+            "rows": [self._rows[position] for position in top],
+            "total": self._size,
+            "matched": matched,
+            "filters": filters,
+        }
+
+
+persona_index = PersonaIndex(dimension=settings.RETRIEVAL_FEATURES)
+persona_replica = PersonaReplica(
+    page_size=settings.REPLICA_PAGE_SIZE,
+    max_staleness=settings.REPLICA_MAX_STALENESS_SECONDS,
+    overlap=settings.REPLICA_WATERMARK_OVERLAP_SECONDS,
+)
+_sync_lock = asyncio.Lock()
+
+
+def load_persona_store(directory: str) -> bool:
+    """
+    Load the persisted index and resume the replica from the position saved
+    with it; the first sync after a restart then only reads the changes.
+    """
+    manifest = load_index(persona_index, directory)
+    if manifest is None:
+        return False
+    if not persona_replica.restore(manifest.get("replica")):
+        logging.info("Vector store has no replica position, the first sync reloads every persona")
+    return True
+
+
+async def refresh_persona_index(client: httpx.AsyncClient, data_version: Optional[str]) -> PersonaIndex:
+    """Sync the personas replica and apply what changed to the index, unless it is still fresh"""
+    if persona_replica.is_fresh(data_version):
+        return persona_index
+    async with _sync_lock:
+        if not persona_replica.is_fresh(data_version):
+            delta = await persona_replica.refresh(client, data_version)
+            if delta is None:
+                return persona_index
+            if delta.full:
+                persona_index.sync(delta.changed, data_version)
+            else:
+                persona_index.remove(delta.deleted)
+                persona_index.upsert(delta.changed)
+                persona_index.version = data_version
+            if settings.VECTOR_STORE_DIR and data_version is not None and (delta.changed or delta.deleted):
+                # Se escribe en un hilo; mientras tanto el índice solo se lee
+                manifest = await asyncio.to_thread(
+                    save_index, persona_index, settings.VECTOR_STORE_DIR, persona_replica.state()
+                )
+                persona_index.remap(open_vectors(settings.VECTOR_STORE_DIR, manifest))
+    return persona_index
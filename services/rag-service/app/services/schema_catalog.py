@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from app.core.metrics import SCHEMA_REFRESHES
+
+# Esquema usado hasta que la primera introspección responda; refleja los
+# valores que realmente guarda la base (nombres de los enums del modelo)
+DEFAULT_SCHEMA: Dict[str, Any] = {
+    "table": "personas",
+    "row_count": None,
+    "columns": [
+        {"name": "id", "type": "integer", "primary_key": True},
+        {"name": "primer_nombre", "type": "character varying", "max_length": 30},
+        {"name": "segundo_nombre", "type": "character varying", "max_length": 30, "nullable": True},
+        {"name": "apellidos", "type": "character varying", "max_length": 50},
+        {"name": "fecha_nacimiento", "type": "date"},
+        {"name": "genero", "type": "genero_enum", "enum_values": ["MASCULINO", "FEMENINO", "NO_BINARIO", "PREFIERO_NO_REPORTAR"]},
+        {"name": "correo", "type": "character varying", "unique": True},
+        {"name": "celular", "type": "character varying", "max_length": 10},
+        {"name": "nro_documento", "type": "character varying", "unique": True},
+        {"name": "tipo_documento", "type": "tipo_documento_enum", "enum_values": ["TARJETA_IDENTIDAD", "CEDULA"]},
+        {"name": "updated_at", "type": "timestamp with time zone"},
+    ],
+    "common_values": {},
+}
+
+
+def _describe_column(column: Dict[str, Any]) -> str:
+    if column.get("enum_values"):
+        kind = f"Enum: {', '.join(column['enum_values'])}"
+    elif column.get("max_length"):
+        kind = f"{column['type']}({column['max_length']})"
+    else:
+        kind = column["type"]
+    notes = []
+    if column.get("primary_key"):
+        notes.append("primary key")
+    elif column.get("unique"):
+        notes.append("unique")
+    if column.get("nullable") and not column.get("primary_key"):
+        null_fraction = column.get("null_fraction")
+        notes.append(f"nullable, {null_fraction:.0%} nulos" if null_fraction else "nullable")
+    return f"- {column['name']} ({', '.join([kind] + notes)})"
+
+
+def render_schema_prompt(schema: Dict[str, Any]) -> str:
+    """Schema section of the SQL generation prompt"""
+    lines = [f"La base de datos tiene una tabla '{schema['table']}' con los siguientes campos:"]
+    lines.extend(_describe_column(column) for column in schema["columns"])
+    surnames = schema.get("common_values", {}).get("apellidos")
+    if surnames:
+        lines.append(f"Apellidos frecuentes: {', '.join(item['value'] for item in surnames)}.")
+    lines.append("Los valores de los enums se escriben exactamente como aparecen arriba.")
+    return "\n        ".join(lines)
+
+
+class SchemaCatalog:
+    """
+    Live description of the `personas` table, read from user-service at
+    startup and every `refresh_seconds` afterwards. Generated SQL prompts
+    and the SQL analyzer read from here, so they follow the real schema and
+    enum values instead of a copy that can drift. Until the first successful
+    refresh, and whenever user-service is unreachable, the last known schema
+    (initially DEFAULT_SCHEMA) keeps being served.
+    """
+
+    def __init__(self, table: str = "personas"):
+        self.table = table
+        self.refreshed_at: Optional[float] = None
+        self._set(DEFAULT_SCHEMA)
+
+    @property
+    def schema(self) -> Dict[str, Any]:
+        return self._schema
+
+    def prompt_section(self) -> str:
+        return self._prompt
+
+    def column_names(self) -> Tuple[str, ...]:
+        return self._columns
+
+    def enum_values(self, column_name: str) -> List[str]:
+        for column in self._schema["columns"]:
+            if column["name"] == column_name:
+                return column.get("enum_values") or []
+        return []
+
+    async def refresh(self, client: httpx.AsyncClient) -> bool:
+        try:
+            response = await client.get(f"/api/v1/schema/{self.table}")
+            response.raise_for_status()
+            schema = response.json()
+            if not schema.get("columns"):
+                raise ValueError("schema without columns")
+        except (httpx.HTTPError, ValueError) as e:
+            SCHEMA_REFRESHES.labels(outcome="error").inc()
+            logging.warning(f"Could not refresh schema of {self.table}: {str(e)}")
+            return False
+        self._set(schema)
+        self.refreshed_at = time.time()
+        SCHEMA_REFRESHES.labels(outcome="ok").inc()
+        return True
+
+    def _set(self, schema: Dict[str, Any]) -> None:
+        self._schema = schema
+        self._columns = tuple(column["name"] for column in schema["columns"])
+        self._prompt = render_schema_prompt(schema)
+
+    async def run(self, client: httpx.AsyncClient, refresh_seconds: float) -> None:
+        """Refresh forever; meant to run as a background task for the app lifetime"""
+        while True:
+            await self.refresh(client)
+            await asyncio.sleep(refresh_seconds)
+
+
+schema_catalog = SchemaCatalog()
@@ -0,0 +1,31 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from app.core.metrics import SINGLE_FLIGHT_COALESCED, SINGLE_FLIGHT_WAITERS
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key: the first caller starts the
+    work and every later caller awaits the same task until it finishes.
+    The work runs as its own task, so a disconnecting caller does not
+    cancel it for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            SINGLE_FLIGHT_COALESCED.labels(endpoint=self.name).inc()
+            SINGLE_FLIGHT_WAITERS.labels(endpoint=self.name).inc()
+            try:
+                return await asyncio.shield(task)
+            finally:
+                SINGLE_FLIGHT_WAITERS.labels(endpoint=self.name).dec()
+
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
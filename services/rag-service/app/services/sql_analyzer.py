@@ -0,0 +1,299 @@
+import difflib
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from app.core.config import settings
+from app.core.metrics import SQL_ANALYSIS
+from app.services.answer_cache import normalize_question
+from app.services.schema_catalog import schema_catalog
+
+TABLE = "personas"
+# Columnas conocidas sin consultar user-service; el analizador usa las del catálogo
+PERSONAS_COLUMNS = (
+    "id",
+    "primer_nombre",
+    "segundo_nombre",
+    "apellidos",
+    "fecha_nacimiento",
+    "genero",
+    "correo",
+    "celular",
+    "nro_documento",
+    "tipo_documento",
+    "updated_at",
+)
+# Columnas que identifican a la persona; se conservan al expandir SELECT *
+IDENTITY_COLUMNS = ("id", "primer_nombre", "segundo_nombre", "apellidos")
+# Palabras de la pregunta (normalizada) que piden una columna, además de su nombre
+COLUMN_HINTS = {
+    "fecha_nacimiento": ("nacimiento", "nacio", "nacieron", "edad", "edades", "cumpleanos", "anos", "mayores", "menores"),
+    "genero": ("sexo", "mujer", "mujeres", "hombre", "hombres", "masculino", "femenino", "binario", "binarios"),
+    "correo": ("email", "mail", "correos", "emails"),
+    "celular": ("telefono", "telefonos", "movil", "celulares", "contacto"),
+    "nro_documento": ("documento", "documentos", "cedula", "identificacion"),
+    "tipo_documento": ("cedula", "tarjeta"),
+    "updated_at": ("actualizado", "actualizados", "actualizacion", "modificado", "modificados"),
+}
+# Frases que piden la fila completa
+FULL_ROW_HINTS = ("todos los datos", "toda la informacion", "informacion completa", "datos completos", "todo sobre")
+# Nombres que el modelo suele inventar para columnas que sí existen
+COLUMN_SYNONYMS = {
+    "nombre": "primer_nombre",
+    "nombres": "primer_nombre",
+    "apellido": "apellidos",
+    "email": "correo",
+    "telefono": "celular",
+    "documento": "nro_documento",
+    "numero_documento": "nro_documento",
+    "sexo": "genero",
+    "fecha_de_nacimiento": "fecha_nacimiento",
+}
+_AGGREGATES = (exp.AggFunc,)
+# Funciones permitidas: agregados, condicionales y ayudas de fechas, texto y
+# números. Cualquier otra (pg_sleep, current_setting, set_config...) se rechaza
+_ALLOWED_FUNCTIONS = (
+    exp.AggFunc, exp.Connector, exp.Exists, exp.Case, exp.If, exp.Cast, exp.TryCast,
+    exp.Coalesce, exp.Nullif, exp.Greatest, exp.Least,
+    exp.Extract, exp.CurrentDate, exp.CurrentTimestamp, exp.CurrentTime, exp.Localtimestamp,
+    exp.Date, exp.DateTrunc, exp.TimestampTrunc, exp.TimeToStr, exp.StrToDate,
+    exp.Lower, exp.Upper, exp.Initcap, exp.Length, exp.Trim, exp.Substring, exp.Concat,
+    exp.Left, exp.Right, exp.Pad, exp.Replace, exp.StrPosition, exp.SplitPart,
+    exp.RegexpReplace, exp.RegexpLike, exp.Reverse,
+    exp.Abs, exp.Round, exp.Floor, exp.Ceil, exp.Trunc, exp.RowNumber,
+)
+# Funciones que sqlglot no reconoce (quedan como Anonymous) y también se permiten
+_ALLOWED_ANONYMOUS = {"age", "make_date", "unaccent"}
+_CODE_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+
+
+class SQLAnalysisError(Exception):
+    """Raised when generated SQL cannot be made into a safe query over `personas`"""
+
+
+@dataclass(frozen=True)
+class AnalyzedSQL:
+    sql: str  # Consulta reescrita que se envía a user-service
+    fixes: Tuple[str, ...]  # Cambios aplicados sobre la consulta original
+
+
+def strip_code_fence(text: str) -> str:
+    """Remove the ``` fence models sometimes wrap code in"""
+    return _CODE_FENCE.sub("", text.strip()).strip()
+
+
+def split_sql_candidates(text: str) -> List[str]:
+    """
+    Read the candidate queries of a multi-candidate answer, expected as a
+    JSON array of strings; falls back to queries separated by semicolons or
+    blank lines when the model ignores the format.
+    """
+    text = strip_code_fence(text)
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, list):
+        return [item.strip() for item in parsed if isinstance(item, str) and item.strip()]
+    return [part.strip() for part in re.split(r";|\n\s*\n", text) if part.strip()]
+
+
+def _fix_column(name: str, columns: Tuple[str, ...]) -> Optional[str]:
+    lowered = name.lower()
+    if lowered in columns:
+        return lowered
+    if COLUMN_SYNONYMS.get(lowered) in columns:
+        return COLUMN_SYNONYMS[lowered]
+    close = difflib.get_close_matches(lowered, columns, n=1, cutoff=0.8)
+    return close[0] if close else None
+
+
+def _check_tables(tree: exp.Expression) -> Set[str]:
+    """Reject tables other than `personas`; returns the names that refer to it"""
+    ctes = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    personas_names = {TABLE}
+    for table in tree.find_all(exp.Table):
+        if table.name in ctes:
+            continue
+        if table.name.lower() != TABLE or (table.db and table.db.lower() not in ("public", "")):
+            raise SQLAnalysisError(f"Unknown table {table.sql(dialect='postgres')}")
+        if table.alias:
+            personas_names.add(table.alias)
+    return personas_names
+
+
+def _check_sources(tree: exp.Select) -> None:
+    """Require every SELECT to read FROM something, and the query to read `personas`"""
+    for select in tree.find_all(exp.Select):
+        if select.args.get("from_") is None:
+            raise SQLAnalysisError("Every SELECT must read FROM personas")
+    # _check_tables ya rechazó las demás tablas; las que no son CTE son personas
+    ctes = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    if all(table.name in ctes for table in tree.find_all(exp.Table)):
+        raise SQLAnalysisError("The query does not read from personas")
+
+
+def _check_functions(tree: exp.Expression) -> None:
+    for function in tree.find_all(exp.Func):
+        if isinstance(function, exp.Anonymous):
+            allowed = function.name.lower() in _ALLOWED_ANONYMOUS
+        else:
+            allowed = isinstance(function, _ALLOWED_FUNCTIONS)
+        if not allowed:
+            name = function.name if isinstance(function, exp.Anonymous) else function.sql_name()
+            raise SQLAnalysisError(f"Function {name} is not allowed")
+
+
+def _reads_personas(select: exp.Select) -> bool:
+    """Whether the SELECT reads `personas` itself, without joins, CTEs or subqueries in between"""
+    source = select.args.get("from_")
+    if source is None or select.args.get("joins") or not isinstance(source.this, exp.Table):
+        return False
+    ctes = {cte.alias_or_name for cte in select.find_all(exp.CTE)}
+    return source.this.name.lower() == TABLE and source.this.name not in ctes
+
+
+def _fix_columns(tree: exp.Expression, columns: Tuple[str, ...], personas_names: Set[str], fixes: List[str]) -> None:
+    aliases = {alias.alias for alias in tree.find_all(exp.Alias)}
+    derived = {node.alias for node in tree.find_all(exp.Subquery, exp.CTE) if node.alias}
+    for column in list(tree.find_all(exp.Column)):
+        if column.table and column.table not in personas_names:
+            if column.table in derived:
+                continue
+            raise SQLAnalysisError(f"Unknown table reference {column.table}")
+        if isinstance(column.this, exp.Star):
+            continue
+        name = column.name
+        if name in columns or (not column.table and name in aliases):
+            continue
+        # Sin calificar y con subconsultas, la columna puede venir de ellas
+        if not column.table and derived:
+            continue
+        fixed = _fix_column(name, columns)
+        if fixed is None:
+            raise SQLAnalysisError(f"Unknown column {name}")
+        column.set("this", exp.to_identifier(fixed))
+        fixes.append(f"column {name} -> {fixed}")
+
+
+def question_columns(question: str, columns: Tuple[str, ...]) -> Optional[Tuple[str, ...]]:
+    """
+    Columns a question asks about, by name, synonym or COLUMN_HINTS word;
+    None when it asks for whole rows ("todos los datos de ...") or names no
+    column, since then it is not known what it needs.
+    """
+    text = normalize_question(question)
+    if any(phrase in text for phrase in FULL_ROW_HINTS):
+        return None
+    words = set(text.split())
+    wanted = []
+    for name in columns:
+        names = {name, name.replace("_", " ")} | set(COLUMN_HINTS.get(name, ()))
+        names |= {synonym for synonym, target in COLUMN_SYNONYMS.items() if target == name}
+        if any(hint in words or (" " in hint and hint in text) for hint in names):
+            wanted.append(name)
+    return tuple(wanted) or None
+
+
+def _expand_star(select: exp.Select, columns: Tuple[str, ...], wanted: Optional[Tuple[str, ...]], fixes: List[str]) -> None:
+    """
+    Replace `*` with the columns the answer needs: the identifying ones, those
+    the question asks about (`wanted`) and those the rest of the query uses.
+    With `wanted` None every column is kept. A `*` over a CTE, a subquery
+    or a join is left alone: those do not have the columns of `personas`.
+    """
+    if not any(projection.is_star for projection in select.expressions) or not _reads_personas(select):
+        return
+    if wanted is None:
+        kept = columns
+    else:
+        referenced = {
+            column.name for column in select.find_all(exp.Column)
+            if not isinstance(column.this, exp.Star)
+        }
+        kept = tuple(name for name in columns if name in IDENTITY_COLUMNS or name in wanted or name in referenced)
+    expanded = []
+    for projection in select.expressions:
+        if projection.is_star:
+            expanded.extend(exp.column(name) for name in kept)
+        else:
+            expanded.append(projection)
+    select.set("expressions", expanded)
+    fixes.append(f"SELECT * -> {len(kept)} of {len(columns)} columns")
+
+
+def _single_row(select: exp.Select) -> bool:
+    """An aggregate without GROUP BY always returns one row, so it needs no LIMIT"""
+    return not select.args.get("group") and all(
+        projection.find(*_AGGREGATES) is not None for projection in select.expressions
+    )
+
+
+def _apply_limit(select: exp.Select, default_limit: int, max_limit: int, fixes: List[str]) -> None:
+    limit = select.args.get("limit")
+    if limit is None:
+        if not _single_row(select):
+            select.set("limit", exp.Limit(expression=exp.Literal.number(default_limit)))
+            fixes.append(f"LIMIT {default_limit} added")
+        return
+    value = limit.expression
+    if not isinstance(value, exp.Literal) or not value.is_int:
+        raise SQLAnalysisError(f"Unsupported LIMIT {value.sql(dialect='postgres')}")
+    if int(value.this) > max_limit:
+        limit.set("expression", exp.Literal.number(max_limit))
+        fixes.append(f"LIMIT {value.this} -> {max_limit}")
+
+
+@lru_cache(maxsize=1024)
+def _analyze(
+    sql: str,
+    columns: Tuple[str, ...],
+    wanted: Optional[Tuple[str, ...]],
+    default_limit: int,
+    max_limit: int,
+) -> AnalyzedSQL:
+    try:
+        statements = [statement for statement in sqlglot.parse(sql, read="postgres") if statement is not None]
+    except ParseError as e:
+        raise SQLAnalysisError(f"Could not parse SQL: {str(e).splitlines()[0]}")
+    if len(statements) != 1:
+        raise SQLAnalysisError("Expected a single statement")
+    tree = statements[0]
+    if not isinstance(tree, exp.Select):
+        raise SQLAnalysisError(f"Only SELECT is allowed, got {tree.key.upper()}")
+    if tree.find(exp.Placeholder) is not None:
+        raise SQLAnalysisError("Bind placeholders are not allowed in generated SQL")
+
+    fixes: List[str] = []
+    personas_names = _check_tables(tree)
+    _check_functions(tree)
+    _check_sources(tree)
+    _fix_columns(tree, columns, personas_names, fixes)
+    _expand_star(tree, columns, wanted, fixes)
+    _apply_limit(tree, default_limit, max_limit, fixes)
+    return AnalyzedSQL(sql=tree.sql(dialect="postgres"), fixes=tuple(fixes))
+
+
+def analyze_sql(sql: str, question: Optional[str] = None) -> AnalyzedSQL:
+    """
+    Parse generated SQL and rewrite it before it reaches user-service: only a
+    single SELECT over `personas` using only allowed functions is accepted,
+    misspelled columns are mapped to real ones, `SELECT *` is narrowed to the
+    columns `question` needs (all of them without a question), a LIMIT is
+    added or capped, and the result is rendered in one canonical form so
+    equivalent queries compare equal.
+    Raises SQLAnalysisError when the query cannot be salvaged.
+    """
+    columns = schema_catalog.column_names()
+    wanted = question_columns(question, columns) if question is not None else None
+    try:
+        analyzed = _analyze(sql.strip(), columns, wanted, settings.SQL_DEFAULT_LIMIT, settings.SQL_MAX_LIMIT)
+    except SQLAnalysisError:
+        SQL_ANALYSIS.labels(outcome="rejected").inc()
+        raise
+    SQL_ANALYSIS.labels(outcome="rewritten" if analyzed.fixes else "unchanged").inc()
+    return analyzed
@@ -0,0 +1,154 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from cachetools import LRUCache
+from app.core.config import settings
+from app.core.metrics import SQL_TEMPLATE_CACHE_HITS, SQL_TEMPLATE_CACHE_MISSES
+from app.services.answer_cache import normalize_question
+
+# Literales que se pueden extraer de una pregunta, en orden de prioridad
+_QUESTION_LITERAL = re.compile(
+    r"(?P<email>[\w.+-]+@[\w-]+\.[\w.-]+)"
+    r"|[\"'«“](?P<text>[^\"'»”]+)[\"'»”]"
+    r"|(?P<date>\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{4})"
+    r"|(?P<number>\b\d+\b)"
+    r"|(?P<name>\b[A-ZÁÉÍÓÚÑ][a-záéíóúñü]+\b)"
+)
+
+# Literales dentro del SQL generado: cadenas entre comillas simples y números
+_SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_BEFORE_LIMIT = re.compile(r"\bLIMIT\s*$", re.IGNORECASE)
+
+
+@dataclass
+class Literal:
+    kind: str
+    value: str
+
+
+@dataclass
+class SQLTemplate:
+    sql: str
+    # Por cada parámetro :pN -> (índice del literal, prefijo, sufijo, modo: text, number o limit)
+    slots: List[Tuple[int, str, str, str]]
+
+
+def extract_literals(question: str) -> Tuple[str, List[Literal]]:
+    """
+    Split a question into a normalized template and the literals it contains.
+    "¿Cuál es el correo de Pérez?" -> ("cual es el correo de __name__", [Literal("name", "Pérez")])
+    The first word is never taken as a name, since it is capitalized anyway.
+    """
+    first_word = re.search(r"\w", question)
+    first_word_start = first_word.start() if first_word else 0
+
+    literals: List[Literal] = []
+    parts: List[str] = []
+    pos = 0
+    for match in _QUESTION_LITERAL.finditer(question):
+        kind = match.lastgroup
+        if kind == "name" and match.start() == first_word_start:
+            continue
+        literals.append(Literal(kind, match.group(kind)))
+        parts.append(question[pos:match.start()])
+        parts.append(f" __{kind}__ ")
+        pos = match.end()
+    parts.append(question[pos:])
+    return normalize_question("".join(parts)), literals
+
+
+def _is_delimited(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else ""
+    after = text[end] if end < len(text) else ""
+    return not before.isalnum() and not after.isalnum()
+
+
+def parameterize_sql(sql: str, literals: List[Literal]) -> Optional[SQLTemplate]:
+    """
+    Replace every occurrence of the question literals in `sql` with :pN bind
+    parameters. Returns None unless every literal was located, because a
+    literal the model rewrote cannot be safely substituted later.
+    """
+    # Los literales más largos primero para no confundir "12" con "1234"
+    candidates = sorted(enumerate(literals), key=lambda item: len(item[1].value), reverse=True)
+    slots: List[Tuple[int, str, str, str]] = []
+    used = set()
+    parts: List[str] = []
+    pos = 0
+
+    for match in _SQL_LITERAL.finditer(sql):
+        token = match.group(0)
+        slot = None
+        for index, literal in candidates:
+            if token.startswith("'"):
+                inner = token[1:-1].replace("''", "'")
+                start = inner.find(literal.value)
+                if start >= 0 and _is_delimited(inner, start, start + len(literal.value)):
+                    slot = (index, inner[:start], inner[start + len(literal.value):], "text")
+                    break
+            elif literal.kind == "number" and token == literal.value:
+                # Un LIMIT tomado de la pregunta se vuelve a acotar al enlazarlo
+                mode = "limit" if _BEFORE_LIMIT.search(sql, 0, match.start()) else "number"
+                slot = (index, "", "", mode)
+                break
+        if slot is None:
+            continue
+        parts.append(sql[pos:match.start()])
+        parts.append(f":p{len(slots)}")
+        pos = match.end()
+        slots.append(slot)
+        used.add(slot[0])
+
+    if len(used) != len(literals):
+        return None
+    parts.append(sql[pos:])
+    return SQLTemplate(sql="".join(parts), slots=slots)
+
+
+def bind_params(template: SQLTemplate, literals: List[Literal]) -> Dict[str, Any]:
+    params: Dict[str, Any] = {}
+    for position, (index, prefix, suffix, mode) in enumerate(template.slots):
+        value = literals[index].value
+        if mode == "limit":
+            params[f"p{position}"] = min(int(value), settings.SQL_MAX_LIMIT)
+        elif mode == "number":
+            params[f"p{position}"] = int(value)
+        else:
+            params[f"p{position}"] = f"{prefix}{value}{suffix}"
+    return params
+
+
+class SQLTemplateCache:
+    """LRU cache from normalized question templates to parameterized SQL"""
+
+    def __init__(self, maxsize: int):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def lookup(self, question: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Return (sql, params) for a known question template, or (None, None)"""
+        key, literals = extract_literals(question)
+        template = self._cache.get(key)
+        if template is None:
+            SQL_TEMPLATE_CACHE_MISSES.inc()
+            return None, None
+        SQL_TEMPLATE_CACHE_HITS.inc()
+        return template.sql, bind_params(template, literals)
+
+    def store(self, question: str, sql: str) -> bool:
+        """Remember the SQL generated for `question`; returns False if it could not be parameterized"""
+        key, literals = extract_literals(question)
+        template = parameterize_sql(sql, literals)
+        if template is None:
+            return False
+        self._cache[key] = template
+        return True
+
+    def discard(self, question: str) -> None:
+        key, _ = extract_literals(question)
+        self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+sql_template_cache = SQLTemplateCache(maxsize=settings.SQL_TEMPLATE_CACHE_MAX_ENTRIES)
@@ -1,7 +1,53 @@
+import time
 import httpx
+from typing import Any, Dict, Optional
 from app.core.config import settings
+from app.core.metrics import STAGE_DURATION
 
-async def get_all_users():
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{settings.USER_SERVICE_URL}/api/v1/personas/")
-        return response.json()
\ No newline at end of file
+# Última versión conocida de los datos de personas y cuándo deja de ser válida
+_data_version: Optional[str] = None
+_data_version_expires_at = 0.0
+
+
+async def get_persona_changes(
+    client: httpx.AsyncClient,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    after: Optional[Dict[str, Any]] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    One page of personas changed after `since` (all of them when None) and
+    of ids deleted since then, as of `until` (the server time when None).
+    `after` is the `next` position of the previous page.
+    """
+    params: Dict[str, Any] = dict(after or {})
+    for name, value in (("since", since), ("until", until), ("limit", limit)):
+        if value is not None:
+            params[name] = value
+    with STAGE_DURATION.labels(stage="fetch_personas").time():
+        response = await client.get("/api/v1/personas/changes", params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+async def get_data_version(client: httpx.AsyncClient) -> Optional[str]:
+    """
+    Return the personas data version stamp from user-service, reusing the last
+    value for DATA_VERSION_TTL_SECONDS. Returns None if it cannot be fetched.
+    """
+    global _data_version, _data_version_expires_at
+
+    now = time.monotonic()
+    if _data_version is not None and now < _data_version_expires_at:
+        return _data_version
+
+    try:
+        response = await client.get("/api/v1/personas/version")
+        if response.status_code != 200:
+            return None
+        _data_version = response.json()["version"]
+        _data_version_expires_at = now + settings.DATA_VERSION_TTL_SECONDS
+        return _data_version
+    except (httpx.HTTPError, KeyError, ValueError):
+        return None
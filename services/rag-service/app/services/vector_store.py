@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Optional
+import numpy as np
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from app.services.retrieval import PersonaIndex
+
+# Estructura del almacén:
+#   <dir>/manifest.json            -> versión de datos, generación vigente y posición de la réplica
+#   <dir>/<generación>/vectors.f32 -> matriz float32 de count x dimension
+#   <dir>/<generación>/ids.json    -> id de persona por fila
+#   <dir>/<generación>/rows.json   -> personas en el mismo orden
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.f32"
+IDS_FILE = "ids.json"
+ROWS_FILE = "rows.json"
+
+
+def _write_json(path: str, data: Any) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def open_vectors(directory: str, manifest: Dict[str, Any]) -> np.ndarray:
+    """
+    Map the vector matrix of the current generation without reading it.
+    Copy-on-write mode lets the index patch rows in memory while untouched
+    pages stay shared with every other replica through the page cache.
+    """
+    path = os.path.join(directory, manifest["generation"], VECTORS_FILE)
+    if manifest["count"] == 0:
+        return np.zeros((0, manifest["dimension"]), dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="c", shape=(manifest["count"], manifest["dimension"]))
+
+
+def save_index(index: "PersonaIndex", directory: str, replica: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Write the index as a new generation and switch the manifest to it,
+    together with the sync position of the replica it was built from.
+    The manifest is replaced atomically, so readers always see a complete
+    generation. Replicas share the directory and may still be loading a
+    generation they read from an older manifest, so superseded generations
+    are only removed VECTOR_STORE_RETENTION_SECONDS after being replaced.
+    """
+    os.makedirs(directory, exist_ok=True)
+    previous = read_manifest(directory)
+    generation = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    generation_dir = os.path.join(directory, generation)
+    os.makedirs(generation_dir)
+
+    rows = list(index.rows)
+    np.ascontiguousarray(index.vectors, dtype=np.float32).tofile(os.path.join(generation_dir, VECTORS_FILE))
+    _write_json(os.path.join(generation_dir, IDS_FILE), [row.get("id") for row in rows])
+    _write_json(os.path.join(generation_dir, ROWS_FILE), rows)
+
+    manifest = {
+        "version": index.version,
+        "generation": generation,
+        "dimension": index.dimension,
+        "count": len(rows),
+        "dtype": "float32",
+        "replica": replica,
+        "created_at": datetime.now().isoformat(),
+    }
+    _write_json(os.path.join(directory, MANIFEST_FILE), manifest)
+
+    # La fecha de modificación de una generación marca cuándo dejó de ser la vigente
+    previous_generation = previous.get("generation") if previous else None
+    if previous_generation:
+        try:
+            os.utime(os.path.join(directory, previous_generation))
+        except OSError:
+            pass
+    keep = {generation, previous_generation}
+    expired = time.time() - settings.VECTOR_STORE_RETENTION_SECONDS
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stale = os.path.isdir(path) and name not in keep and os.path.getmtime(path) < expired
+        except OSError:
+            continue
+        if stale:
+            shutil.rmtree(path, ignore_errors=True)
+    return manifest
+
+
+def load_index(index: "PersonaIndex", directory: str) -> Optional[Dict[str, Any]]:
+    """Restore `index` from the store; returns its manifest, or None if there is nothing usable"""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+    if manifest.get("dimension") != index.dimension:
+        logging.warning(
+            f"Vector store dimension {manifest.get('dimension')} does not match "
+            f"RETRIEVAL_FEATURES={index.dimension}, ignoring it"
+        )
+        return None
+
+    try:
+        generation_dir = os.path.join(directory, manifest["generation"])
+        with open(os.path.join(generation_dir, IDS_FILE)) as f:
+            ids = json.load(f)
+        with open(os.path.join(generation_dir, ROWS_FILE)) as f:
+            rows = json.load(f)
+        if ids != [row.get("id") for row in rows]:
+            raise ValueError("id map does not match stored rows")
+        index.restore(open_vectors(directory, manifest), rows, manifest["version"])
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Could not load vector store from {directory}: {str(e)}")
+        return None
+    return manifest
@@ -5,6 +5,8 @@ from datetime import datetime
 from typing import Dict, List, Any
 from fastapi import Request, Response
 import uuid
+from contextvars import ContextVar
+from typing import Optional
 
 # Configure logger
 logging.basicConfig(
@@ -12,12 +14,22 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
 )
 
+# Id of the request being handled, so nested calls can be linked to it
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def get_request_id() -> Optional[str]:
+    return request_id_var.get()
+
 # In-memory log storage
 api_logs: List[Dict[str, Any]] = []
 
 # Maximum logs to keep in memory
 MAX_LOGS = 1000
 
+# Responses with these content types are passed through without buffering
+STREAMING_MEDIA_TYPES = ("text/event-stream", "application/x-ndjson")
+
 class APILogger:
     @staticmethod
     def log_request(request_id: str, method: str, path: str, headers: Dict = None, request_body: Any = None, query_params: Dict = None, client_ip: str = None):
@@ -101,14 +113,22 @@ class APILogger:
         return log_entry
     
     @staticmethod
-    def log_ai_response(request_id: str, response: str, processing_time: float = None):
+    def log_ai_response(request_id: str, response: str, processing_time: float = None, model: str = None,
+                        outcome: str = None, prompt_chars: int = None, input_tokens: int = None,
+                        output_tokens: int = None, time_to_first_token: float = None):
         """Log AI model responses specifically"""
         log_entry = {
             "id": request_id,
             "timestamp": datetime.now().isoformat(),
             "type": "ai_response",
             "response": response,
-            "processing_time_ms": processing_time * 1000 if processing_time is not None else None
+            "processing_time_ms": processing_time * 1000 if processing_time is not None else None,
+            "model": model,
+            "outcome": outcome,
+            "prompt_chars": prompt_chars,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "time_to_first_token_ms": time_to_first_token * 1000 if time_to_first_token is not None else None
         }
         logging.info(f"AI Response: {json.dumps(log_entry, default=str)}")
         api_logs.append(log_entry)
@@ -131,6 +151,7 @@ class APILogger:
 # Middleware to log requests and responses
 async def logging_middleware(request: Request, call_next):
     request_id = str(uuid.uuid4())
+    request_id_var.set(request_id)
     start_time = time.time()
     
     # Get client IP
@@ -191,6 +212,17 @@ async def logging_middleware(request: Request, call_next):
         if "set-cookie" in response_headers:
             response_headers["set-cookie"] = "[REDACTED]"
         
+        # Streaming responses are returned as-is so chunks reach the client immediately
+        if any(media_type in response.headers.get("content-type", "") for media_type in STREAMING_MEDIA_TYPES):
+            APILogger.log_response(
+                request_id=request_id,
+                status_code=response.status_code,
+                headers=response_headers,
+                response_body="[stream]",
+                processing_time=process_time
+            )
+            return response
+        
         # Get response body
         response_body = None
         response_body_bytes = b""
@@ -0,0 +1,50 @@
+import json
+from typing import Any, Dict, List, Tuple
+import httpx
+
+NDJSON = "application/x-ndjson"
+# Último registro NDJSON de /execute-sql cuando user-service recortó el resultado
+TRUNCATED_KEY = "$truncated"
+TRUNCATED_HEADER = "X-Result-Truncated"
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+
+def ndjson_line(data: Any) -> str:
+    """Format one newline-delimited JSON record"""
+    return json.dumps(data, default=str, ensure_ascii=False) + "\n"
+
+
+def wants_event_stream(accept: str) -> bool:
+    return "text/event-stream" in (accept or "")
+
+
+def wants_ndjson(accept: str) -> bool:
+    return "application/x-ndjson" in (accept or "")
+
+
+async def read_json_rows(response: httpx.Response, max_rows: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Read the rows of a streamed /execute-sql response, stopping after
+    `max_rows`; closing the stream early stops the transfer. Returns the rows
+    and whether the result had more: either user-service capped it (the
+    `$truncated` record, or TRUNCATED_HEADER for plain JSON from an older
+    user-service) or a row beyond `max_rows` arrived.
+    """
+    if not response.headers.get("content-type", "").startswith(NDJSON):
+        rows = json.loads(await response.aread())
+        truncated = response.headers.get(TRUNCATED_HEADER) == "true" or len(rows) > max_rows
+        return rows[:max_rows], truncated
+    rows = []
+    truncated = False
+    async for line in response.aiter_lines():
+        if line:
+            row = json.loads(line)
+            if TRUNCATED_KEY in row or len(rows) >= max_rows:
+                truncated = True
+                break
+            rows.append(row)
+    return rows, truncated
@@ -0,0 +1,120 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from typing import Optional
+from app.core.database import get_db
+from app.core.data_version import get_data_version
+from app.utils.logger import APILogger
+import uuid
+
+router = APIRouter()
+
+# Tablas que se pueden describir; evita exponer el resto del esquema
+DESCRIBABLE_TABLES = {"personas"}
+COMMON_VALUES_LIMIT = 10
+
+COLUMNS_SQL = text("""
+    SELECT c.column_name, c.data_type, c.udt_name, c.character_maximum_length, c.is_nullable
+    FROM information_schema.columns c
+    WHERE c.table_schema = current_schema() AND c.table_name = :table
+    ORDER BY c.ordinal_position
+""")
+
+# Índices de una sola columna: primary key y unique. Una columna puede tener
+# varios (la pkey y un índice simple), así que se combinan por columna
+KEYS_SQL = text("""
+    SELECT a.attname, bool_or(i.indisprimary) AS indisprimary, bool_or(i.indisunique) AS indisunique
+    FROM pg_index i
+    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+    WHERE i.indrelid = to_regclass(:table) AND i.indnatts = 1
+    GROUP BY a.attname
+""")
+
+ENUM_VALUES_SQL = text("""
+    SELECT t.typname, e.enumlabel
+    FROM pg_type t
+    JOIN pg_enum e ON e.enumtypid = t.oid
+    ORDER BY t.typname, e.enumsortorder
+""")
+
+# Estadísticas que ANALYZE (o autovacuum) ya guarda: no se recorre la tabla.
+# reltuples es -1 mientras la tabla no se haya analizado nunca
+ROW_ESTIMATE_SQL = text("""
+    SELECT reltuples::bigint AS row_count FROM pg_class WHERE oid = to_regclass(:table)
+""")
+
+COLUMN_STATS_SQL = text("""
+    SELECT attname, null_frac, n_distinct, most_common_vals::text::text[] AS common_values, most_common_freqs
+    FROM pg_stats
+    WHERE schemaname = current_schema() AND tablename = :table AND NOT inherited
+""")
+
+# Columnas cuyos valores frecuentes se publican; otras pueden ser datos personales
+COMMON_VALUE_COLUMNS = {"apellidos"}
+
+
+def _distinct_values(n_distinct: float, row_count: Optional[int]) -> Optional[int]:
+    """pg_stats gives n_distinct as a count, or negated as a fraction of the rows"""
+    if n_distinct >= 0:
+        return int(n_distinct)
+    return round(-n_distinct * row_count) if row_count else None
+
+
+@router.get("/schema/{table}")
+async def describe_table(table: str, db: AsyncSession = Depends(get_db)):
+    """
+    Describe a table for SQL generation: columns with type, nullability,
+    keys and enum values, plus lightweight statistics read from pg_stats
+    (estimated row count, null fraction and distinct values per column and
+    the most common surnames). They are as fresh as the last ANALYZE, and
+    null until the table was analyzed once.
+    """
+    request_id = str(uuid.uuid4())
+    if table not in DESCRIBABLE_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table {table}")
+
+    try:
+        columns = (await db.execute(COLUMNS_SQL, {"table": table})).fetchall()
+        keys = {row.attname: row for row in await db.execute(KEYS_SQL, {"table": table})}
+        enums = {}
+        for row in await db.execute(ENUM_VALUES_SQL):
+            enums.setdefault(row.typname, []).append(row.enumlabel)
+
+        row_count = (await db.execute(ROW_ESTIMATE_SQL, {"table": table})).scalar()
+        if row_count is not None and row_count < 0:
+            row_count = None
+        stats = {row.attname: row for row in await db.execute(COLUMN_STATS_SQL, {"table": table})}
+
+        described = []
+        common_values = {}
+        for column in columns:
+            key = keys.get(column.column_name)
+            column_stats = stats.get(column.column_name)
+            described.append({
+                "name": column.column_name,
+                "type": column.udt_name if column.data_type == "USER-DEFINED" else column.data_type,
+                "max_length": column.character_maximum_length,
+                "nullable": column.is_nullable == "YES",
+                "primary_key": bool(key and key.indisprimary),
+                "unique": bool(key and key.indisunique),
+                "enum_values": enums.get(column.udt_name),
+                "null_fraction": round(column_stats.null_frac, 4) if column_stats else None,
+                "distinct_values": _distinct_values(column_stats.n_distinct, row_count) if column_stats else None,
+            })
+            if column.column_name in COMMON_VALUE_COLUMNS and column_stats and column_stats.common_values:
+                common_values[column.column_name] = [
+                    {"value": value, "count": round(frequency * row_count) if row_count else None}
+                    for value, frequency in list(zip(column_stats.common_values, column_stats.most_common_freqs))[:COMMON_VALUES_LIMIT]
+                ]
+
+        return {
+            "table": table,
+            "version": await get_data_version(db),
+            "row_count": row_count,
+            "columns": described,
+            "common_values": common_values,
+        }
+    except Exception as e:
+        error_msg = f"Error describing table {table}: {str(e)}"
+        APILogger.log_error(request_id, error_msg, 500)
+        raise HTTPException(status_code=500, detail=error_msg)
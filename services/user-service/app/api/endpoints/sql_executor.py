@@ -1,14 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy import text
 from pydantic import BaseModel
-from app.core.database import get_db
+from datetime import date
+from typing import Any, AsyncIterator, Dict, List, Optional
+from app.core.config import settings
+from app.core.database import SQLSessionLocal
+from app.core.sql_governor import (
+    RowCap,
+    SQLQueryRejectedError,
+    SQLQueueFullError,
+    apply_limits,
+    check_cost,
+    explain,
+    is_timeout,
+    sql_governor,
+)
+from app.core.sql_shapes import ShapeLRU, normalize_query, note_prepared
+from app.utils.result_formats import ARROW_STREAM, ENCODERS, JSON, MEDIA_TYPES, json_body, negotiate
+import base64
+import hashlib
+import json
 import re
 
 router = APIRouter()
 
+# asyncpg exige objetos date para parámetros de tipo date; las fechas llegan como texto
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# Presupuesto restante del llamador en milisegundos (ver rag-service)
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+# Token para pedir la página siguiente cuando se usa page_size
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# "true" cuando la respuesta JSON se recortó a SQL_MAX_ROWS filas (o a page_size)
+TRUNCATED_HEADER = "X-Result-Truncated"
+
+# Veredicto de is_safe_query por forma de consulta: las formas se repiten con otros literales
+_safe_shapes = ShapeLRU("safety", settings.SQL_SAFETY_CACHE_SIZE)
+
 class SQLQuery(BaseModel):
     query: str
+    params: Optional[Dict[str, Any]] = None  # Bind parameters referenced as :name in the query
+    explain: bool = False  # Return the query plan instead of running the query
+    page_size: Optional[int] = None  # Return at most this many rows, plus a continuation token
+    cursor: Optional[str] = None  # Continuation token from a previous page of the same query
 
 def is_safe_query(query: str) -> bool:
     query_lower = query.lower().strip()
@@ -35,21 +70,164 @@ def is_safe_query(query: str) -> bool:
     
     return True
 
+def bind_params(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        name: date.fromisoformat(value) if isinstance(value, str) and ISO_DATE.match(value) else value
+        for name, value in (params or {}).items()
+    }
+
+def _query_fingerprint(query_data: SQLQuery) -> str:
+    identity = json.dumps([query_data.query, query_data.params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(identity.encode()).hexdigest()[:16]
+
+def encode_cursor(query_data: SQLQuery, offset: int) -> str:
+    token = json.dumps({"q": _query_fingerprint(query_data), "o": offset})
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+def decode_cursor(query_data: SQLQuery) -> int:
+    """Offset encoded in the continuation token; it is only valid for the query that issued it"""
+    if not query_data.cursor:
+        return 0
+    try:
+        padded = query_data.cursor + "=" * (-len(query_data.cursor) % 4)
+        token = json.loads(base64.urlsafe_b64decode(padded))
+        offset = int(token["o"])
+        fingerprint = token["q"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if fingerprint != _query_fingerprint(query_data) or offset < 0:
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this query")
+    return offset
+
+def _governed_error(error: Exception) -> HTTPException:
+    """HTTP error for a query the governor refused or the database cancelled"""
+    if isinstance(error, HTTPException):
+        return error
+    if isinstance(error, SQLQueueFullError):
+        # 429 y no 503: el servicio está sano, solo ocupado con otras consultas
+        return HTTPException(status_code=429, detail=f"Too many queries running: {str(error)}", headers={"Retry-After": "1"})
+    if isinstance(error, SQLQueryRejectedError):
+        return HTTPException(status_code=422, detail=f"Query rejected: {str(error)}")
+    if is_timeout(error):
+        return HTTPException(status_code=422, detail="Query cancelled: it ran longer than the statement timeout")
+    return HTTPException(status_code=500, detail=f"Error executing query: {str(error)}")
+
+async def stream_rows(sql: str, params: Dict[str, Any], deadline_ms: Optional[float], cap: RowCap) -> AsyncIterator[Any]:
+    """
+    Run the query on a server-side cursor of the read-only SQL pool: yields
+    the column names first and then chunks of SQL_FETCH_CHUNK_ROWS rows, so
+    memory does not grow with the result. Holds a governor slot and its own
+    session for as long as the response lasts; stops once `cap` is reached.
+    """
+    async with sql_governor.slot():
+        async with SQLSessionLocal() as db:
+            async with db.begin():
+                await apply_limits(db, deadline_ms)
+                note_prepared((await db.connection()).info, sql)
+                await check_cost(db, sql, params)
+                statement = text(sql).execution_options(yield_per=settings.SQL_FETCH_CHUNK_ROWS)
+                result = await db.stream(statement, params)
+                yield list(result.keys())
+                async for partition in result.partitions():
+                    chunk = cap.take([tuple(row) for row in partition])
+                    if chunk:
+                        yield chunk
+                    if cap.truncated:
+                        break
+
 @router.post("/execute-sql")
-async def execute_sql(query_data: SQLQuery, db: Session = Depends(get_db)):
-    if not is_safe_query(query_data.query):
+async def execute_sql(
+    query_data: SQLQuery,
+    deadline_ms: Optional[float] = Header(None, alias=DEADLINE_HEADER),
+    accept: Optional[str] = Header(None)
+):
+    """
+    Run a read-only query and stream its rows in the format asked for with
+    Accept: a JSON array of objects (default), NDJSON, columnar JSON or an
+    Arrow IPC stream. With `page_size`, at most that many rows are returned
+    and NEXT_CURSOR_HEADER carries the token for the next page; a page with
+    fewer rows is the last one. Pages are only stable for ordered queries.
+
+    Queries run under the SQL governor: on their own read-only pool, with a
+    statement timeout, limited concurrency and at most SQL_MAX_ROWS rows.
+    A capped result is flagged in TRUNCATED_HEADER for JSON and at the end
+    of the body for the streaming formats.
+    """
+    # Literales fuera del texto: las consultas de la misma forma comparten
+    # la sentencia preparada y el plan, y el chequeo de seguridad
+    shape, literals = normalize_query(query_data.query) if settings.SQL_LIFT_LITERALS else (query_data.query, {})
+    if not _safe_shapes.lookup(shape, lambda: is_safe_query(shape)):
         raise HTTPException(
             status_code=400, 
             detail="Invalid query. Only SELECT statements are allowed and certain operations are restricted."
         )
     
+    if deadline_ms is not None and deadline_ms <= 0:
+        raise HTTPException(status_code=504, detail="Request deadline already exceeded")
+
+    params = {**bind_params(query_data.params), **literals}
+    if query_data.explain:
+        try:
+            async with sql_governor.slot():
+                async with SQLSessionLocal() as db:
+                    async with db.begin():
+                        await apply_limits(db, deadline_ms)
+                        return {"plan": await explain(db, shape, params)}
+        except Exception as e:
+            raise _governed_error(e)
+
+    media_type = negotiate(accept)
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=f"Supported formats: {', '.join(MEDIA_TYPES)}")
+    if media_type == ARROW_STREAM:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=406, detail="Arrow output is not available on this server")
+
+    limit = settings.SQL_MAX_ROWS
+    offset = 0
+    headers = {}
+    if query_data.page_size is not None:
+        if query_data.page_size < 1:
+            raise HTTPException(status_code=400, detail="page_size must be positive")
+        limit = min(limit, query_data.page_size)
+        offset = decode_cursor(query_data)
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(query_data, offset + limit)
+    # Una fila de más indica si el resultado se recortó sin leer el resto
+    sql = f"SELECT * FROM ({shape}) AS governed LIMIT :_governed_limit OFFSET :_governed_offset"
+    params = {**params, "_governed_limit": limit + 1, "_governed_offset": offset}
+    cap = RowCap(limit)
+
+    # Se lee la primera parte antes de responder, para que un error de la
+    # consulta llegue como código HTTP y no como un cuerpo cortado
+    rows = stream_rows(sql, params, deadline_ms, cap)
     try:
-        result = db.execute(text(query_data.query))
-        columns = result.keys()
-        rows = []
-        for row in result:
-            rows.append({column: value for column, value in zip(columns, row)})
-        return rows
+        columns: List[str] = await rows.__anext__()
+        first = await rows.__anext__()
+    except StopAsyncIteration:
+        first = []
     except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error executing query: {str(e)}")
\ No newline at end of file
+        await rows.aclose()
+        raise _governed_error(e)
+
+    if media_type == JSON:
+        # El JSON por defecto se arma completo (a lo sumo SQL_MAX_ROWS filas) y el recorte va en un header
+        try:
+            collected = list(first)
+            async for chunk in rows:
+                collected.extend(chunk)
+        except Exception as e:
+            raise _governed_error(e)
+        headers[TRUNCATED_HEADER] = "true" if cap.truncated else "false"
+        return Response(json_body(columns, collected), media_type=JSON, headers=headers)
+
+    async def chunks():
+        if first:
+            yield first
+        async for chunk in rows:
+            yield chunk
+
+    return StreamingResponse(
+        ENCODERS[media_type](columns, chunks(), lambda: cap.truncated), media_type=media_type, headers=headers
+    )
@@ -4,7 +4,7 @@ import uuid
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from fastapi.responses import FileResponse
 from typing import Optional, List
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
 from app.models.models import PersonalDataDB
 
@@ -23,8 +23,8 @@ def get_file_extension(filename: str) -> str:
     return os.path.splitext(filename)[1].lower()
 
 # Función para verificar que la persona existe
-def verify_person_exists(person_id: int, db: Session):
-    person = db.query(PersonalDataDB).filter(PersonalDataDB.id == person_id).first()
+async def verify_person_exists(person_id: int, db: AsyncSession):
+    person = await db.get(PersonalDataDB, person_id)
     if not person:
         raise HTTPException(status_code=404, detail=f"Persona con ID {person_id} no encontrada")
     return person
@@ -36,7 +36,7 @@ def get_person_directory(person_id: int) -> str:
     return person_dir
 
 @router.post("/upload/{person_id}")
-async def upload_photo(person_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_photo(person_id: int, file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
     """
     Sube una foto al servidor y la asocia con una persona específica.
     
@@ -46,7 +46,7 @@ async def upload_photo(person_id: int, file: UploadFile = File(...), db: Session
     Retorna el nombre del archivo generado y detalles para accederlo posteriormente.
     """
     # Verificar que la persona existe
-    person = verify_person_exists(person_id, db)
+    person = await verify_person_exists(person_id, db)
     
     try:
         # Verificar tamaño del archivo
@@ -95,7 +95,7 @@ async def upload_photo(person_id: int, file: UploadFile = File(...), db: Session
         await file.close()
 
 @router.get("/person/{person_id}")
-async def get_person_photos(person_id: int, db: Session = Depends(get_db)):
+async def get_person_photos(person_id: int, db: AsyncSession = Depends(get_db)):
     """
     Obtiene todas las fotos asociadas a una persona específica.
     
@@ -104,7 +104,7 @@ async def get_person_photos(person_id: int, db: Session = Depends(get_db)):
     Retorna una lista de todas las fotos disponibles para esa persona.
     """
     # Verificar que la persona existe
-    verify_person_exists(person_id, db)
+    await verify_person_exists(person_id, db)
     
     person_dir = os.path.join(UPLOAD_DIRECTORY, str(person_id))
     
@@ -123,7 +123,7 @@ async def get_person_photos(person_id: int, db: Session = Depends(get_db)):
     return photos
 
 @router.get("/person/{person_id}/{filename}")
-async def get_person_photo(person_id: int, filename: str, db: Session = Depends(get_db)):
+async def get_person_photo(person_id: int, filename: str, db: AsyncSession = Depends(get_db)):
     """
     Obtiene una foto específica de una persona.
     
@@ -133,7 +133,7 @@ async def get_person_photo(person_id: int, filename: str, db: Session = Depends(
     Retorna la imagen para ser mostrada.
     """
     # Verificar que la persona existe
-    verify_person_exists(person_id, db)
+    await verify_person_exists(person_id, db)
     
     file_path = os.path.join(UPLOAD_DIRECTORY, str(person_id), filename)
     
@@ -195,7 +195,7 @@ async def get_photo(filename: str):
     raise HTTPException(status_code=404, detail="Imagen no encontrada")
 
 @router.delete("/person/{person_id}/{filename}")
-async def delete_person_photo(person_id: int, filename: str, db: Session = Depends(get_db)):
+async def delete_person_photo(person_id: int, filename: str, db: AsyncSession = Depends(get_db)):
     """
     Elimina una foto específica de una persona.
     
@@ -203,7 +203,7 @@ async def delete_person_photo(person_id: int, filename: str, db: Session = Depen
     - **filename**: Nombre del archivo a eliminar
     """
     # Verificar que la persona existe
-    verify_person_exists(person_id, db)
+    await verify_person_exists(person_id, db)
     
     file_path = os.path.join(UPLOAD_DIRECTORY, str(person_id), filename)
     
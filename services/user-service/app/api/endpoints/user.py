@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, tuple_
+from datetime import datetime
+from typing import List, Optional
 from app.core.database import get_db
-from app.models.models import PersonalDataDB
+from app.core.data_version import get_data_version
+from app.models.models import PersonalDataDB, PersonaTombstoneDB
 from app.models.schemas import PersonalData, PersonalDataResponse
 from app.utils.logger import APILogger
 import uuid
@@ -14,8 +17,81 @@ class TipoDocumentoDB(str, PyEnum):
     TARJETA_IDENTIDAD = "TARJETA_DE_IDENTIDAD"
     CEDULA = "CEDULA"
 
+@router.get("/personas/", response_model=List[PersonalDataResponse])
+async def get_personas(skip: int = 0, limit: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    request_id = str(uuid.uuid4())
+    try:
+        query = select(PersonalDataDB).order_by(PersonalDataDB.id).offset(skip)
+        if limit is not None:
+            query = query.limit(limit)
+        return (await db.scalars(query)).all()
+    except Exception as e:
+        error_msg = f"Error retrieving personas: {str(e)}"
+        APILogger.log_error(request_id, error_msg, 500)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.get("/personas/version")
+async def get_personas_version(db: AsyncSession = Depends(get_db)):
+    return {"version": await get_data_version(db)}
+
+@router.get("/personas/changes")
+async def get_personas_changes(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_updated_at: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Personas written after `since` (all of them when absent) and ids deleted
+    since then, for clients that keep a local copy. `watermark` is the
+    database time the changes were read at; passing it back as `until` keeps
+    later pages consistent with the first one, and as the next `since` reads
+    only what changed afterwards.
+
+    Pages are read by keyset in (updated_at, id) order: `next` is the
+    position after the last row, to pass back as `after_updated_at` and
+    `after_id`, and is null on the last page. A row written during the sync
+    leaves the window without shifting the others, and the next sync reads it.
+    Deleted ids come with the first page only.
+    """
+    request_id = str(uuid.uuid4())
+    try:
+        watermark = until or await db.scalar(select(func.now()))
+        query = select(PersonalDataDB).where(PersonalDataDB.updated_at <= watermark)
+        if since is not None:
+            query = query.where(PersonalDataDB.updated_at > since)
+        first_page = after_updated_at is None or after_id is None
+        deleted = []
+        if since is not None and first_page:
+            deleted = list(await db.scalars(
+                select(PersonaTombstoneDB.id)
+                .where(PersonaTombstoneDB.deleted_at > since, PersonaTombstoneDB.deleted_at <= watermark)
+                .order_by(PersonaTombstoneDB.id)
+            ))
+        if not first_page:
+            position = tuple_(after_updated_at, after_id, types=(PersonalDataDB.updated_at.type, PersonalDataDB.id.type))
+            query = query.where(tuple_(PersonalDataDB.updated_at, PersonalDataDB.id) > position)
+        query = query.order_by(PersonalDataDB.updated_at, PersonalDataDB.id)
+        if limit is not None:
+            query = query.limit(limit)
+        rows = (await db.scalars(query)).all()
+        last = rows[-1] if limit is not None and len(rows) == limit else None
+        return {
+            "rows": [PersonalDataResponse.model_validate(row) for row in rows],
+            "deleted": deleted,
+            "next": {"after_updated_at": last.updated_at, "after_id": last.id} if last else None,
+            "watermark": watermark,
+            "version": await get_data_version(db),
+        }
+    except Exception as e:
+        error_msg = f"Error retrieving persona changes: {str(e)}"
+        APILogger.log_error(request_id, error_msg, 500)
+        raise HTTPException(status_code=500, detail=error_msg)
+
 @router.post("/personas/", response_model=PersonalDataResponse)
-async def create_persona(persona: PersonalData, db: Session = Depends(get_db)):
+async def create_persona(persona: PersonalData, db: AsyncSession = Depends(get_db)):
     request_id = str(uuid.uuid4())
     
     db_persona = PersonalDataDB(
@@ -32,11 +108,11 @@ async def create_persona(persona: PersonalData, db: Session = Depends(get_db)):
     
     try:
         db.add(db_persona)
-        db.commit()
-        db.refresh(db_persona)
+        await db.commit()
+        await db.refresh(db_persona)
         return db_persona
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         error_msg = f"Error creating persona: {str(e)}"
         APILogger.log_error(request_id, error_msg, 400)
         raise HTTPException(status_code=400, detail=error_msg)
@@ -47,11 +123,11 @@ async def create_persona(persona: PersonalData, db: Session = Depends(get_db)):
 async def update_persona(
     persona_id: int, 
     persona: PersonalData, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     request_id = str(uuid.uuid4())
     
-    db_persona = db.query(PersonalDataDB).filter(PersonalDataDB.id == persona_id).first()
+    db_persona = await db.get(PersonalDataDB, persona_id)
     if db_persona is None:
         error_msg = f"Persona with id {persona_id} not found"
         APILogger.log_error(request_id, error_msg, 404)
@@ -61,31 +137,33 @@ async def update_persona(
         setattr(db_persona, field, value)
     
     try:
-        db.commit()
-        db.refresh(db_persona)
+        await db.commit()
+        await db.refresh(db_persona)
         return db_persona
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         error_msg = f"Error updating persona: {str(e)}"
         APILogger.log_error(request_id, error_msg, 400)
         raise HTTPException(status_code=400, detail=error_msg)
 
 @router.delete("/personas/{persona_id}")
-async def delete_persona(persona_id: int, db: Session = Depends(get_db)):
+async def delete_persona(persona_id: int, db: AsyncSession = Depends(get_db)):
     request_id = str(uuid.uuid4())
     
-    db_persona = db.query(PersonalDataDB).filter(PersonalDataDB.id == persona_id).first()
+    db_persona = await db.get(PersonalDataDB, persona_id)
     if db_persona is None:
         error_msg = f"Persona with id {persona_id} not found"
         APILogger.log_error(request_id, error_msg, 404)
         raise HTTPException(status_code=404, detail=error_msg)
     
     try:
-        db.delete(db_persona)
-        db.commit()
+        await db.delete(db_persona)
+        # El id queda registrado para que las réplicas también lo borren
+        await db.merge(PersonaTombstoneDB(id=persona_id, deleted_at=func.now()))
+        await db.commit()
         return {"message": "Persona deleted successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         error_msg = f"Error deleting persona: {str(e)}"
         APILogger.log_error(request_id, error_msg, 400)
         raise HTTPException(status_code=400, detail=error_msg)
\ No newline at end of file
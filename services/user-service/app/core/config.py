@@ -11,12 +11,51 @@ class Settings(BaseSettings):
 
     DATABASE_URL: Optional[str] = None
 
+    # Pool of the async engine, per worker process
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10  # Extra connections opened under bursts, closed when idle
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+
+    # /execute-sql
+    SQL_DATABASE_URL: Optional[str] = None  # e.g. a read-only role or replica; defaults to DATABASE_URL
+    SQL_POOL_SIZE: int = 4  # Connections of the read-only pool; no overflow
+    SQL_FETCH_CHUNK_ROWS: int = 500  # Rows fetched from the server-side cursor at a time
+    SQL_MAX_ROWS: int = 10000  # Rows returned at most; larger results are flagged as truncated
+    SQL_STATEMENT_TIMEOUT_MS: int = 5000
+    SQL_WORK_MEM: Optional[str] = "16MB"  # work_mem for each query, e.g. "16MB"
+    SQL_MAX_COST: Optional[float] = 100000.0  # Planner cost above which queries are rejected; disabled when unset
+    SQL_MAX_CONCURRENCY: int = 4  # Queries running at the same time, per worker process
+    SQL_MAX_QUEUE: int = 32  # Queries waiting for a slot before rejecting
+    SQL_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    SQL_LIFT_LITERALS: bool = True  # Turn comparison literals into bind parameters so query shapes repeat
+    SQL_STATEMENT_CACHE_SIZE: int = 256  # Prepared statements kept per connection of the read-only pool
+    SQL_SAFETY_CACHE_SIZE: int = 1024  # Query shapes whose is_safe_query verdict is remembered
+    SQL_COST_CACHE_SIZE: int = 1024  # Query shapes remembered as under SQL_MAX_COST, skipping their EXPLAIN
+
     @property
     def sync_database_url(self) -> str:
         if self.DATABASE_URL:
             return self.DATABASE_URL
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    @property
+    def async_database_url(self) -> str:
+        return self._async_url(self.sync_database_url)
+
+    @staticmethod
+    def _async_url(url: str) -> str:
+        for scheme in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+            if url.startswith(scheme):
+                return "postgresql+asyncpg://" + url[len(scheme):]
+        return url
+
+    @property
+    def async_sql_database_url(self) -> str:
+        if self.SQL_DATABASE_URL:
+            return self._async_url(self.SQL_DATABASE_URL)
+        return self.async_database_url
+
     class Config:
         env_file = ".env"
         case_sensitive = True
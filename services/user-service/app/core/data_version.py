@@ -0,0 +1,20 @@
+import hashlib
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import PersonalDataDB, PersonaTombstoneDB
+
+# Sello de versión de los datos de personas.
+# Se calcula desde la base de datos (última escritura, último borrado y
+# cantidad de filas), así que todos los procesos y réplicas del servicio
+# reportan la misma versión, y cambia con cualquier escritura, la haga quien la haga.
+_VERSION_QUERY = select(
+    func.max(PersonalDataDB.updated_at),
+    func.count(PersonalDataDB.id),
+    select(func.max(PersonaTombstoneDB.deleted_at)).scalar_subquery(),
+)
+
+
+async def get_data_version(db: AsyncSession) -> str:
+    last_write, rows, last_delete = (await db.execute(_VERSION_QUERY)).one()
+    stamp = f"{last_write}|{rows}|{last_delete}"
+    return hashlib.sha1(stamp.encode()).hexdigest()[:16]
@@ -1,21 +1,45 @@
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-# Create SQLAlchemy engine
-engine = create_engine(settings.sync_database_url)
+# Create async SQLAlchemy engine (asyncpg); Alembic keeps using the sync URL
+engine = create_async_engine(
+    settings.async_database_url,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
 
-# Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create SessionLocal class; objects stay readable after commit for the response
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+# Separate, smaller pool for the ad hoc queries of /execute-sql, so they can
+# never hold every connection; its sessions can only read
+sql_engine = create_async_engine(
+    settings.async_sql_database_url,
+    pool_size=settings.SQL_POOL_SIZE,
+    max_overflow=0,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    connect_args={
+        "server_settings": {
+            "default_transaction_read_only": "on",
+            "application_name": "user-service-sql",
+        },
+        # Cada conexión guarda sus sentencias preparadas (LRU) por texto SQL;
+        # las formas normalizadas de /execute-sql las reutilizan
+        "prepared_statement_cache_size": settings.SQL_STATEMENT_CACHE_SIZE,
+    } if settings.async_sql_database_url.startswith("postgresql+asyncpg://") else {},
+)
+SQLSessionLocal = async_sessionmaker(sql_engine, autoflush=False, expire_on_commit=False)
 
 # Create Base class
 Base = declarative_base()
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
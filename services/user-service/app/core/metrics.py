@@ -0,0 +1,22 @@
+from prometheus_client import Counter
+
+# Query shape caches of /execute-sql (cache="statement", "safety" o "cost")
+SQL_SHAPE_CACHE_HITS = Counter(
+    "user_sql_shape_cache_hits_total",
+    "Query shapes found in a cache: already prepared on the connection, or already checked as safe or cheap",
+    ["cache"],
+)
+SQL_SHAPE_CACHE_MISSES = Counter(
+    "user_sql_shape_cache_misses_total",
+    "Query shapes not found in a cache and prepared or checked anew",
+    ["cache"],
+)
+SQL_SHAPE_CACHE_EVICTIONS = Counter(
+    "user_sql_shape_cache_evictions_total",
+    "Least recently used query shapes dropped from a full cache",
+    ["cache"],
+)
+SQL_LIFTED_LITERALS = Counter(
+    "user_sql_lifted_literals_total",
+    "Literals of /execute-sql queries turned into bind parameters",
+)
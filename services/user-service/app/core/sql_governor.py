@@ -0,0 +1,136 @@
+import asyncio
+import re
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.sql_shapes import ShapeLRU
+
+# SQLSTATE de PostgreSQL para una consulta cancelada por statement_timeout
+QUERY_CANCELED = "57014"
+_MEMORY_SETTING = re.compile(r"^\d+\s*(kB|MB|GB)?$")
+
+# Formas de consulta cuyo EXPLAIN ya quedó por debajo de SQL_MAX_COST
+_cheap_shapes = ShapeLRU("cost", settings.SQL_COST_CACHE_SIZE)
+
+
+class SQLQueueFullError(Exception):
+    """Raised when too many queries are already waiting for a free slot"""
+
+
+class SQLQueryRejectedError(Exception):
+    """Raised when a query is refused before or while running (cost, time)"""
+
+
+class SQLGovernor:
+    """
+    Admission control for /execute-sql: at most `max_concurrency` queries
+    run at once and at most `max_queue` more wait, each for up to
+    `queue_timeout` seconds. Keeps ad hoc queries from taking every database
+    connection away from the CRUD endpoints.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            raise SQLQueueFullError(f"{self._waiting} queries already waiting")
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise SQLQueueFullError(f"No free slot after {self.queue_timeout:.0f}s")
+        finally:
+            self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+def statement_timeout_ms(deadline_ms: Optional[float]) -> int:
+    """Configured statement timeout, shortened to the caller's remaining budget"""
+    timeout = settings.SQL_STATEMENT_TIMEOUT_MS
+    if deadline_ms is not None:
+        timeout = min(timeout, deadline_ms)
+    return max(int(timeout), 1)
+
+
+async def apply_limits(db: AsyncSession, deadline_ms: Optional[float]) -> None:
+    """
+    Per-transaction limits for an ad hoc query, like SET LOCAL they end with
+    the transaction. set_config takes the values as parameters, so the
+    statement text stays the same and is prepared once per connection.
+    """
+    await db.execute(
+        text("SELECT set_config('statement_timeout', :timeout, true)"),
+        {"timeout": str(statement_timeout_ms(deadline_ms))},
+    )
+    if settings.SQL_WORK_MEM and _MEMORY_SETTING.match(settings.SQL_WORK_MEM):
+        await db.execute(text("SELECT set_config('work_mem', :work_mem, true)"), {"work_mem": settings.SQL_WORK_MEM})
+
+
+async def explain(db: AsyncSession, sql: str, params: Dict[str, Any]) -> Any:
+    return (await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params)).scalar()
+
+
+async def check_cost(db: AsyncSession, sql: str, params: Dict[str, Any]) -> None:
+    """
+    Refuse queries whose planner estimate is above SQL_MAX_COST, before
+    running them. A shape that passed once is not explained again; other
+    literals could plan worse, but the statement timeout still bounds it.
+    Rejections are not remembered, so a shape can pass with other literals.
+    """
+    if settings.SQL_MAX_COST is None or _cheap_shapes.get(sql, False):
+        return
+    plan = await explain(db, sql, params)
+    top = plan[0]["Plan"]
+    if top["Total Cost"] > settings.SQL_MAX_COST:
+        raise SQLQueryRejectedError(
+            f"Estimated cost {top['Total Cost']:.0f} (about {top['Plan Rows']} rows) exceeds the limit of {settings.SQL_MAX_COST:.0f}"
+        )
+    _cheap_shapes.put(sql, True)
+
+
+def is_timeout(error: Exception) -> bool:
+    orig = getattr(error, "orig", None)
+    return isinstance(error, DBAPIError) and QUERY_CANCELED in (getattr(orig, "sqlstate", None), getattr(orig, "pgcode", None))
+
+
+class RowCap:
+    """
+    Pass through at most `max_rows` rows of a chunked result; `truncated`
+    turns true when the query had more (it is run with one extra row of
+    LIMIT so this is known without reading further).
+    """
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self.seen = 0
+        self.truncated = False
+
+    def take(self, chunk: List[Sequence[Any]]) -> List[Sequence[Any]]:
+        room = self.max_rows - self.seen
+        if len(chunk) > room:
+            self.truncated = True
+            chunk = chunk[:max(room, 0)]
+        self.seen += len(chunk)
+        return chunk
+
+
+sql_governor = SQLGovernor(
+    max_concurrency=settings.SQL_MAX_CONCURRENCY,
+    max_queue=settings.SQL_MAX_QUEUE,
+    queue_timeout=settings.SQL_QUEUE_TIMEOUT_SECONDS,
+)
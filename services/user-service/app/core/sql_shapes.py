@@ -0,0 +1,154 @@
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, MutableMapping, Tuple, TypeVar
+from app.core.config import settings
+from app.core.metrics import SQL_LIFTED_LITERALS, SQL_SHAPE_CACHE_EVICTIONS, SQL_SHAPE_CACHE_HITS, SQL_SHAPE_CACHE_MISSES
+
+T = TypeVar("T")
+
+# Prefijo reservado para los parámetros que reemplazan literales
+LITERAL_PARAM = "_literal_"
+
+_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+)
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<opaque>(?:[EeBbXxNn]|[Uu]&)'(?:[^'\\]|\\.|'')*'|\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$|"(?:[^"]|"")*")
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<param>(?<!:):[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<op><=|>=|<>|!=|::|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+# Restos que el tokenizador no sabe leer como PostgreSQL: comillas o
+# comentarios sin cerrar (quedan sueltos como operadores)
+_UNLEXABLE = {"'", '"', "$", "/*"}
+_COMPARISONS = {"=", "<>", "!=", "<", ">", "<=", ">="}
+_BEFORE_LITERAL = {"LIKE", "ILIKE", "LIMIT", "OFFSET", "BETWEEN"}
+# Textos que parecen números, fechas u horas: se comparan con columnas no
+# textuales, y asyncpg no acepta str para esos tipos, así que quedan en línea
+_TYPED_TEXT = re.compile(r"^[\d\s:.+\-/TZ]*$", re.IGNORECASE)
+_INT4 = 2 ** 31
+
+
+def _liftable(kind: str, text: str) -> bool:
+    if kind == "number":
+        return text.isdigit() and int(text) < _INT4
+    return not _TYPED_TEXT.match(text[1:-1])
+
+
+def _value(kind: str, text: str) -> Any:
+    return int(text) if kind == "number" else text[1:-1].replace("''", "'")
+
+
+def normalize_query(sql: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Shape of a query: comments dropped, whitespace collapsed and literals
+    turned into `:_literal_N` bind parameters, returned with their values.
+    Queries that only differ in those literals get the same text, so each
+    connection prepares and plans it once.
+
+    Only literals whose type PostgreSQL infers from the other side are
+    lifted: integers and text compared with =, <>, <, >, LIKE, BETWEEN or
+    IN, and LIMIT/OFFSET counts. Typed literals (`DATE '...'`, `'...'::int`)
+    and strings that look like numbers or dates stay in the text.
+
+    Text the tokenizer cannot read the way PostgreSQL does (nested or
+    unterminated comments, unterminated quotes) is returned unchanged, so
+    the checks and the database see exactly what the caller sent.
+    """
+    tokens: List[Tuple[str, str]] = []
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup if match.lastgroup != "tag" else "opaque"
+        text = match.group()
+        # PostgreSQL anida los comentarios /* */; aquí el primer */ los cerraría
+        if kind == "comment" and "/*" in text[2:] or kind == "op" and (text in _UNLEXABLE or sql.startswith("/*", match.start())):
+            return sql, {}
+        if kind in ("space", "comment"):
+            if tokens and tokens[-1][0] != "space":
+                tokens.append(("space", " "))
+            continue
+        tokens.append((kind, text))
+    significant = [i for i, (kind, _) in enumerate(tokens) if kind != "space"]
+
+    params: Dict[str, Any] = {}
+    parens: List[bool] = []  # True para los paréntesis de una lista IN
+    between = False
+    previous = ""
+    for position, i in enumerate(significant):
+        kind, text = tokens[i]
+        following = tokens[significant[position + 1]][1] if position + 1 < len(significant) else ""
+        upper_bound = between and previous == "AND"
+        if upper_bound:
+            between = False
+        if kind in ("number", "string") and following != "::" and _liftable(kind, text):
+            in_list = bool(parens) and parens[-1] and previous in ("(", ",")
+            if previous in _COMPARISONS or previous in _BEFORE_LITERAL or in_list or upper_bound:
+                name = f"{LITERAL_PARAM}{len(params)}"
+                params[name] = _value(kind, text)
+                tokens[i] = ("param", f":{name}")
+        if text == "(":
+            parens.append(previous == "IN")
+        elif text == ")" and parens:
+            parens.pop()
+        upper = text.upper() if kind == "word" else text
+        if upper == "BETWEEN":
+            between = True
+        previous = upper
+
+    if params:
+        SQL_LIFTED_LITERALS.inc(len(params))
+    return "".join(text for _, text in tokens).strip(), params
+
+
+class ShapeLRU:
+    """
+    Bounded map from query shape to a computed value, evicting the least
+    recently used shape; hits, misses and evictions are counted under `name`.
+    """
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, shape: str, default: Any = None) -> Any:
+        if shape in self._entries:
+            self._entries.move_to_end(shape)
+            SQL_SHAPE_CACHE_HITS.labels(cache=self.name).inc()
+            return self._entries[shape]
+        SQL_SHAPE_CACHE_MISSES.labels(cache=self.name).inc()
+        return default
+
+    def put(self, shape: str, value: Any) -> None:
+        self._entries[shape] = value
+        self._entries.move_to_end(shape)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            SQL_SHAPE_CACHE_EVICTIONS.labels(cache=self.name).inc()
+
+    def lookup(self, shape: str, compute: Callable[[], T]) -> T:
+        if shape in self._entries:
+            return self.get(shape)
+        SQL_SHAPE_CACHE_MISSES.labels(cache=self.name).inc()
+        value = compute()
+        self.put(shape, value)
+        return value
+
+
+def note_prepared(connection_info: MutableMapping[str, Any], sql: str) -> None:
+    """
+    Record that `sql` runs as a prepared statement on the connection owning
+    `connection_info`. The driver keeps the statements themselves in an LRU
+    of the same size; this mirror only counts how often a shape was already
+    prepared there.
+    """
+    cache = connection_info.get("statement_shapes")
+    if cache is None:
+        cache = connection_info["statement_shapes"] = ShapeLRU("statement", settings.SQL_STATEMENT_CACHE_SIZE)
+    cache.lookup(sql, lambda: True)
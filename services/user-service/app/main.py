@@ -1,12 +1,24 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware  # Importar el middleware CORS
-from app.api.endpoints import user, uploadPhoto, sql_executor, logs
+from app.api.endpoints import user, uploadPhoto, sql_executor, logs, schema
+from app.core.database import engine, sql_engine
 from app.utils.logger import logging_middleware  # Import the middleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Cierra las conexiones del pool al apagar el servicio
+    await engine.dispose()
+    await sql_engine.dispose()
 
 app = FastAPI(
     title="NeoReg API",
     description="API for NeoReg project",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -24,8 +36,13 @@ app.middleware("http")(logging_middleware)
 app.include_router(user.router, prefix="/api/v1")
 app.include_router(uploadPhoto.router, prefix="/api/v1")
 app.include_router(sql_executor.router, prefix="/api/v1")
+app.include_router(schema.router, prefix="/api/v1")
 app.include_router(logs.router, prefix="/api/v1")  # Add the logs router
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to NeoReg API"}
\ No newline at end of file
+    return {"message": "Welcome to NeoReg API"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
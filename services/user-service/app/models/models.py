@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Enum, Index
+from sqlalchemy import Column, Integer, String, Date, DateTime, Enum, Index, func
 from app.core.database import Base
 from enum import Enum as PyEnum
 
@@ -25,8 +25,19 @@ class PersonalDataDB(Base):
     celular = Column(String(10), nullable=False)
     nro_documento = Column(String, unique=True, nullable=False)
     tipo_documento = Column(Enum(TipoDocumentoDB, name='tipo_documento_enum'), nullable=False)
+    # Marca de la última escritura; los clientes piden los cambios desde aquí
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     __table_args__ = (
         Index("idx_correo", "correo"),
         Index("idx_nro_documento", "nro_documento"),
-    )
\ No newline at end of file
+        Index("idx_personas_updated_at", "updated_at", "id"),
+    )
+
+
+class PersonaTombstoneDB(Base):
+    """Ids of deleted personas, so incremental readers can drop them too"""
+    __tablename__ = "personas_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    deleted_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
\ No newline at end of file
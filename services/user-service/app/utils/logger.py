@@ -4,6 +4,7 @@ import time
 from datetime import datetime
 from typing import Dict, List, Any
 from fastapi import Request, Response
+from app.utils.result_formats import ARROW_STREAM, COLUMNAR_JSON, NDJSON
 import uuid
 
 # Configure logger
@@ -19,6 +20,9 @@ api_logs: List[Dict[str, Any]] = []
 # Maximum logs to keep in memory
 MAX_LOGS = 1000
 
+# Responses with these content types are passed through without buffering
+STREAMING_MEDIA_TYPES = ("text/event-stream", NDJSON, COLUMNAR_JSON, ARROW_STREAM)
+
 class APILogger:
     @staticmethod
     def log_request(request_id: str, method: str, path: str, headers: Dict = None, request_body: Any = None, query_params: Dict = None, client_ip: str = None):
@@ -154,6 +158,17 @@ async def logging_middleware(request: Request, call_next):
         if "set-cookie" in response_headers:
             response_headers["set-cookie"] = "[REDACTED]"
         
+        # Streaming responses are returned as-is so chunks reach the client immediately
+        if any(media_type in response.headers.get("content-type", "") for media_type in STREAMING_MEDIA_TYPES):
+            APILogger.log_response(
+                request_id=request_id,
+                status_code=response.status_code,
+                headers=response_headers,
+                response_body="[stream]",
+                processing_time=process_time
+            )
+            return response
+        
         # Get response body
         response_body = None
         response_body_bytes = b""
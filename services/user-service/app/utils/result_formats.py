@@ -0,0 +1,128 @@
+import io
+import json
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence
+
+# Formatos de resultado de /execute-sql, negociados con Accept
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+COLUMNAR_JSON = "application/vnd.neoreg.columnar+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MEDIA_TYPES = (NDJSON, COLUMNAR_JSON, ARROW_STREAM, JSON)
+# Último registro NDJSON cuando el resultado se recortó al máximo de filas
+TRUNCATED_RECORD = {"$truncated": True}
+
+Chunks = AsyncIterator[List[Sequence[Any]]]
+# Se consulta al terminar: si la consulta tenía más filas de las enviadas
+Truncated = Callable[[], bool]
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick the result format for an Accept header, honouring q-values. Returns
+    JSON when nothing is asked for, and None when no offered format is acceptable.
+    """
+    if not accept:
+        return JSON
+    best, best_q = None, 0.0
+    for part in accept.split(","):
+        media_type, *options = [item.strip() for item in part.split(";")]
+        q = 1.0
+        for option in options:
+            if option.startswith("q="):
+                try:
+                    q = float(option[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type in ("*/*", "application/*"):
+            media_type = JSON
+        if media_type in MEDIA_TYPES and q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, default=str, ensure_ascii=False)
+
+
+def json_body(columns: List[str], rows: List[Sequence[Any]]) -> str:
+    """JSON array of row objects, the historical response shape"""
+    return "[" + ",".join(_dumps(dict(zip(columns, row))) for row in rows) + "]"
+
+
+async def ndjson_rows(columns: List[str], chunks: Chunks, truncated: Truncated) -> AsyncIterator[str]:
+    """One JSON object per row and line, then TRUNCATED_RECORD if rows were left out"""
+    async for chunk in chunks:
+        if chunk:
+            yield "".join(_dumps(dict(zip(columns, row))) + "\n" for row in chunk)
+    if truncated():
+        yield _dumps(TRUNCATED_RECORD) + "\n"
+
+
+async def columnar_rows(columns: List[str], chunks: Chunks, truncated: Truncated) -> AsyncIterator[str]:
+    """`{"columns": [...], "rows": [[...], ...], "truncated": false}`: column names once, then value arrays"""
+    yield '{"columns": ' + _dumps(columns) + ', "rows": ['
+    first = True
+    async for chunk in chunks:
+        if chunk:
+            yield ("" if first else ",") + ",".join(_dumps(list(row)) for row in chunk)
+            first = False
+    yield '], "truncated": ' + _dumps(truncated()) + "}"
+
+
+async def arrow_rows(columns: List[str], chunks: Chunks, truncated: Truncated) -> AsyncIterator[bytes]:
+    """
+    Arrow IPC stream with one record batch per fetched chunk. Column types
+    come from the first non-empty chunk; columns that are all null there are
+    sent as strings. A truncated result ends with an empty batch whose
+    custom metadata has `truncated: true`.
+    """
+    import pyarrow as pa
+
+    buffer = io.BytesIO()
+    writer = None
+    schema = None
+
+    def drain() -> bytes:
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    def array(values: List[Any], field: Any) -> Any:
+        try:
+            return pa.array(values, type=field.type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if not pa.types.is_string(field.type):
+                raise
+            return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        values = list(zip(*chunk))
+        if schema is None:
+            inferred = [pa.array(list(column)) for column in values]
+            schema = pa.schema([
+                pa.field(name, pa.string() if pa.types.is_null(column.type) else column.type)
+                for name, column in zip(columns, inferred)
+            ])
+            writer = pa.ipc.new_stream(buffer, schema)
+        batch = pa.RecordBatch.from_arrays([array(list(column), field) for column, field in zip(values, schema)], schema=schema)
+        writer.write_batch(batch)
+        yield drain()
+
+    if writer is None:
+        schema = pa.schema([pa.field(name, pa.string()) for name in columns])
+        writer = pa.ipc.new_stream(buffer, schema)
+    if truncated():
+        writer.write_batch(pa.RecordBatch.from_pylist([], schema=schema), custom_metadata={"truncated": "true"})
+    writer.close()
+    yield drain()
+
+
+# JSON se arma en memoria (hasta el máximo de filas) para poder marcar el recorte en un header
+ENCODERS = {
+    NDJSON: ndjson_rows,
+    COLUMNAR_JSON: columnar_rows,
+    ARROW_STREAM: arrow_rows,
+}
@@ -0,0 +1,36 @@
+"""personas_change_tracking
+
+Revision ID: c4d2e8f1a7b3
+Revises: b95945a1d0a5
+Create Date: 2025-03-20 10:12:45.218311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d2e8f1a7b3'
+down_revision: Union[str, None] = 'b95945a1d0a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('personas', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    op.create_index('idx_personas_updated_at', 'personas', ['updated_at', 'id'], unique=False)
+    op.create_table('personas_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_personas_tombstones_deleted_at'), 'personas_tombstones', ['deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_personas_tombstones_deleted_at'), table_name='personas_tombstones')
+    op.drop_table('personas_tombstones')
+    op.drop_index('idx_personas_updated_at', table_name='personas')
+    op.drop_column('personas', 'updated_at')
@@ -0,0 +1,29 @@
+"""change_tracking_timestamptz
+
+Revision ID: e7a1c3d9b2f4
+Revises: c4d2e8f1a7b3
+Create Date: 2025-03-24 09:41:17.530824
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a1c3d9b2f4'
+down_revision: Union[str, None] = 'c4d2e8f1a7b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Los valores existentes se interpretan en la zona horaria de la sesión, la misma de now()
+    op.alter_column('personas', 'updated_at', type_=sa.DateTime(timezone=True), existing_nullable=False, existing_server_default=sa.text('now()'))
+    op.alter_column('personas_tombstones', 'deleted_at', type_=sa.DateTime(timezone=True), existing_nullable=False, existing_server_default=sa.text('now()'))
+
+
+def downgrade() -> None:
+    op.alter_column('personas_tombstones', 'deleted_at', type_=sa.DateTime(), existing_nullable=False, existing_server_default=sa.text('now()'))
+    op.alter_column('personas', 'updated_at', type_=sa.DateTime(), existing_nullable=False, existing_server_default=sa.text('now()'))
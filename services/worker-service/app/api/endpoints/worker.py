@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.core.database import get_db
 from app.models.models import PersonalDataDB
@@ -10,10 +11,10 @@ import uuid
 router = APIRouter()
 
 @router.get("/workers/", response_model=List[PersonalDataResponse])
-async def get_workers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_workers(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     request_id = str(uuid.uuid4())
     try:
-        workers = db.query(PersonalDataDB).offset(skip).limit(limit).all()
+        workers = (await db.scalars(select(PersonalDataDB).offset(skip).limit(limit))).all()
         return workers
     except Exception as e:
         error_msg = f"Error retrieving workers: {str(e)}"
@@ -21,10 +22,10 @@ async def get_workers(skip: int = 0, limit: int = 100, db: Session = Depends(get
         raise HTTPException(status_code=500, detail=error_msg)
 
 @router.get("/workers/{worker_id}", response_model=PersonalDataResponse)
-async def get_worker(worker_id: int, db: Session = Depends(get_db)):
+async def get_worker(worker_id: int, db: AsyncSession = Depends(get_db)):
     request_id = str(uuid.uuid4())
     
-    worker = db.query(PersonalDataDB).filter(PersonalDataDB.id == worker_id).first()
+    worker = await db.get(PersonalDataDB, worker_id)
     if worker is None:
         error_msg = f"Worker with id {worker_id} not found"
         APILogger.log_error(request_id, error_msg, 404)
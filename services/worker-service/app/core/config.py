@@ -11,12 +11,26 @@ class Settings(BaseSettings):
 
     DATABASE_URL: Optional[str] = None
 
+    # Pool of the async engine, per worker process
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10  # Extra connections opened under bursts, closed when idle
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+
     @property
     def sync_database_url(self) -> str:
         if self.DATABASE_URL:
             return self.DATABASE_URL
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    @property
+    def async_database_url(self) -> str:
+        url = self.sync_database_url
+        for scheme in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+            if url.startswith(scheme):
+                return "postgresql+asyncpg://" + url[len(scheme):]
+        return url
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,11 +1,21 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.endpoints import worker, logs
+from app.core.database import engine
 from app.utils.logger import logging_middleware
 from fastapi.middleware.cors import CORSMiddleware  # Importar el middleware CORS
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Cierra las conexiones del pool al apagar el servicio
+    await engine.dispose()
+
 app = FastAPI(
     title="Worker Service API",
     description="API for managing worker-related operations",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 app.add_middleware(
     CORSMiddleware,